@@ -0,0 +1,34 @@
+"""Общие помощники для команд замера производительности."""
+import time
+
+
+def percentile(samples, q):
+    """Перцентиль q (0..100) по отсортированной выборке."""
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1, max(0, round(q / 100 * len(samples)) - 1))
+    return samples[index]
+
+
+def summarize(samples):
+    """Сводка по замерам в секундах, результат в миллисекундах."""
+    ordered = sorted(samples)
+    total = sum(ordered)
+    return {
+        'count': len(ordered),
+        'mean_ms': round(total / len(ordered) * 1000, 3) if ordered else 0,
+        'p50_ms': round(percentile(ordered, 50) * 1000, 3),
+        'p90_ms': round(percentile(ordered, 90) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 99) * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3) if ordered else 0,
+    }
+
+
+def timed(func, repeat):
+    """Вызывает func repeat раз и возвращает длительности вызовов."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
@@ -0,0 +1,201 @@
+"""Двухуровневый кеш: LRU в памяти процесса перед общим хранилищем.
+
+Пример настройки::
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.TieredCache',
+            'LOCATION': 'shared',          # псевдоним общего кеша
+            'OPTIONS': {
+                'LOCAL_MAX_ENTRIES': 1000,
+                'LOCAL_MAX_BYTES': 16 * 1024 * 1024,
+                'LOCAL_TIMEOUT': 5,
+                'LOCAL_SKIP_PREFIXES': ('posts:listing_version',),
+            },
+        },
+        'shared': {...},
+    }
+
+Локальный уровень общий для всех потоков процесса, как у LocMemCache.
+Другие процессы узнают об изменениях не позже чем через
+``LOCAL_TIMEOUT`` секунд; ключи с префиксами из ``LOCAL_SKIP_PREFIXES``
+всегда читаются из общего хранилища.
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+_stores = {}
+_stats = {}
+_locks = {}
+
+
+class TieredCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = location
+        self._max_entries = options.get('LOCAL_MAX_ENTRIES', 1000)
+        self._max_bytes = options.get('LOCAL_MAX_BYTES', 16 * 1024 * 1024)
+        self._local_timeout = options.get('LOCAL_TIMEOUT', 5)
+        self._skip_prefixes = tuple(options.get('LOCAL_SKIP_PREFIXES', ()))
+        self._store = _stores.setdefault(location, OrderedDict())
+        self._stats = _stats.setdefault(location, {
+            'local_hits': 0, 'shared_hits': 0, 'misses': 0,
+            'local_bytes': 0,
+        })
+        self._lock = _locks.setdefault(location, threading.Lock())
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    # Локальный уровень.
+
+    def _local_get(self, key):
+        with self._lock:
+            entry = self._store.get(key)
+            if entry is None:
+                return None
+            expires, size, pickled = entry
+            if expires <= time.monotonic():
+                self._local_drop(key)
+                return None
+            self._store.move_to_end(key)
+        return pickle.loads(pickled)
+
+    def _local_set(self, key, value, timeout, version=None):
+        if key.startswith(self._skip_prefixes):
+            return
+        local_key = self.make_key(key, version=version)
+        local_timeout = self._local_timeout
+        if timeout is not DEFAULT_TIMEOUT and timeout is not None:
+            local_timeout = min(local_timeout, timeout)
+        # Значение, которое не помещаем в память, не должно оставить
+        # там прежнее: иначе процесс будет отдавать устаревшее.
+        if local_timeout <= 0:
+            self._local_delete(local_key)
+            return
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        size = len(pickled)
+        if size > self._max_bytes:
+            self._local_delete(local_key)
+            return
+        with self._lock:
+            self._local_drop(local_key)
+            self._store[local_key] = (time.monotonic() + local_timeout,
+                                      size, pickled)
+            self._stats['local_bytes'] += size
+            while (len(self._store) > self._max_entries
+                   or self._stats['local_bytes'] > self._max_bytes):
+                self._local_drop(next(iter(self._store)))
+
+    def _local_drop(self, key):
+        entry = self._store.pop(key, None)
+        if entry is not None:
+            self._stats['local_bytes'] -= entry[1]
+
+    def _local_delete(self, key):
+        with self._lock:
+            self._local_drop(key)
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def stats(self):
+        """Счётчики попаданий и промахов с момента запуска процесса."""
+        with self._lock:
+            stats = dict(self._stats, local_entries=len(self._store))
+        return stats
+
+    # API кеша Django.
+
+    def get(self, key, default=None, version=None):
+        local_key = self.make_key(key, version=version)
+        self.validate_key(local_key)
+        value = self._local_get(local_key)
+        if value is not None:
+            self._count('local_hits')
+            return value
+        value = self.shared.get(key, version=version)
+        if value is None:
+            self._count('misses')
+            return default
+        self._count('shared_hits')
+        self._local_set(key, value, self._local_timeout, version)
+        return value
+
+    def get_many(self, keys, version=None):
+        found = {}
+        missing = []
+        for key in keys:
+            local_key = self.make_key(key, version=version)
+            self.validate_key(local_key)
+            value = self._local_get(local_key)
+            if value is None:
+                missing.append(key)
+            else:
+                found[key] = value
+        shared = self.shared.get_many(missing, version=version)
+        for key, value in shared.items():
+            self._local_set(key, value, self._local_timeout, version)
+        self._count('local_hits', len(found))
+        self._count('shared_hits', len(shared))
+        self._count('misses', len(missing) - len(shared))
+        found.update(shared)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_key(key, version=version)
+        self.validate_key(local_key)
+        self.shared.set(key, value, timeout, version=version)
+        self._local_set(key, value, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version)
+        for key, value in data.items():
+            if key in failed:
+                self._local_delete(self.make_key(key, version=version))
+            else:
+                self._local_set(key, value, timeout, version)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            self._local_set(key, value, timeout, version)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self._local_delete(self.make_key(key, version=version))
+        return self.shared.incr(key, delta, version=version)
+
+    def delete(self, key, version=None):
+        self._local_delete(self.make_key(key, version=version))
+        self.shared.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self._local_delete(self.make_key(key, version=version))
+        self.shared.delete_many(keys, version=version)
+
+    def has_key(self, key, version=None):
+        local_key = self.make_key(key, version=version)
+        return (self._local_get(local_key) is not None
+                or self.shared.has_key(key, version=version))
+
+    def clear(self):
+        with self._lock:
+            self._store.clear()
+            self._stats['local_bytes'] = 0
+        self.shared.clear()
@@ -0,0 +1,94 @@
+"""Чтение с реплик, запись в основную базу.
+
+``ReplicaRouter`` отправляет чтения на случайную реплику из
+``settings.DATABASE_REPLICAS``, а все записи - в ``default``. Реплики
+отстают, поэтому чтения идут в основную базу:
+
+* внутри транзакции на ``default``;
+* в потоке, который уже что-то записал, - до конца запроса;
+* в запросах, закреплённых за основной базой (``pin_to_primary``).
+
+``ReplicaRoutingMiddleware`` закрепляет небезопасные методы и запросы
+с cookie, которую ставит после записи на ``REPLICA_STICKY_SECONDS``:
+автор сразу видит свой пост, комментарий или подписку.
+"""
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+STICKY_COOKIE = 'primary_db'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+_state = threading.local()
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def is_pinned():
+    return getattr(_state, 'pinned', False) or getattr(_state, 'wrote', False)
+
+
+@contextmanager
+def pin_to_primary(pinned=True):
+    """Закрепляет чтения блока за основной базой (``pinned=True``).
+
+    Отметка о записи действует только внутри блока.
+    """
+    saved = getattr(_state, 'pinned', False), getattr(_state, 'wrote', False)
+    _state.pinned, _state.wrote = pinned, False
+    try:
+        yield _state
+    finally:
+        _state.pinned, _state.wrote = saved
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        aliases = replicas()
+        if not aliases or is_pinned():
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db in aliases:
+            # Связи объекта читаем из той же реплики, что и сам объект.
+            return instance._state.db
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(aliases)
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схему реплики получают копированием (sync_replicas).
+        return db not in replicas()
+
+
+class ReplicaRoutingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pinned = (request.method not in SAFE_METHODS
+                  or STICKY_COOKIE in request.COOKIES)
+        with pin_to_primary(pinned) as state:
+            response = self.get_response(request)
+            wrote = state.wrote
+        if wrote and replicas():
+            response.set_cookie(
+                STICKY_COOKIE, '1',
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True, samesite='Lax',
+            )
+        return response
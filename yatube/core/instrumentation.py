@@ -0,0 +1,78 @@
+"""Сбор статистики запросов к БД по вьюхам.
+
+``QueryRecorder`` подключается к соединениям через
+``connection.execute_wrapper`` и считает запросы, их время и
+«отпечатки» - SQL без значений. Один и тот же отпечаток много раз за
+запрос почти всегда означает N+1: ленивую загрузку связи в цикле.
+Сводки по вьюхам копятся в ``aggregates`` в памяти процесса.
+"""
+import re
+import threading
+import time
+from collections import Counter
+
+IN_LIST_RE = re.compile(r'\bIN \((?:%s|\?)(?:, (?:%s|\?))*\)')
+NUMBER_RE = re.compile(r'\b\d+\b')
+SPACE_RE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """SQL без чисел и с одинаковыми IN-списками любой длины."""
+    sql = IN_LIST_RE.sub('IN (...)', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    return SPACE_RE.sub(' ', sql).strip()
+
+
+class QueryRecorder:
+    """Обёртка execute: число, время и отпечатки запросов."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def repeated(self, threshold):
+        """Отпечатки SELECT, повторённые не меньше threshold раз."""
+        return [
+            (sql, total)
+            for sql, total in self.fingerprints.most_common()
+            if total >= threshold and sql.startswith('SELECT')
+        ]
+
+
+class Aggregates:
+    """Сводка по вьюхам: запросы, время SQL и шаблонов, медленные."""
+
+    FIELDS = ('requests', 'queries', 'sql_seconds', 'render_seconds',
+              'total_seconds', 'slow', 'n_plus_one')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def add(self, view, **values):
+        with self._lock:
+            row = self._views.setdefault(view, dict.fromkeys(self.FIELDS, 0))
+            row['requests'] += 1
+            for name, value in values.items():
+                row[name] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {view: dict(row) for view, row in self._views.items()}
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+
+aggregates = Aggregates()
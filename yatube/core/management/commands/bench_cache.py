@@ -0,0 +1,61 @@
+import itertools
+import json
+import tempfile
+
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from core.benchmark import summarize, timed
+
+FILE_BACKEND = 'django.core.cache.backends.filebased.FileBasedCache'
+
+
+def backends(location):
+    shared = {'BACKEND': FILE_BACKEND, 'LOCATION': location}
+    return {
+        'filebased': {'default': shared},
+        'tiered': {
+            'default': {
+                'BACKEND': 'core.cache.TieredCache',
+                'LOCATION': 'shared',
+                'OPTIONS': {'LOCAL_SKIP_PREFIXES': ('posts:listing_version',
+                                                    'posts:user_version')},
+            },
+            'shared': shared,
+        },
+    }
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает FileBasedCache и TieredCache на запросах '
+            'главной страницы.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Количество запросов на каждый бэкенд.')
+        parser.add_argument('--pages', type=int, default=3,
+                            help='Сколько страниц списка запрашивать '
+                                 'по кругу.')
+
+    def handle(self, *args, **options):
+        url = reverse('posts:index')
+        pages = itertools.cycle(range(1, options['pages'] + 1))
+        results = {}
+        with tempfile.TemporaryDirectory() as location:
+            for name, config in backends(location).items():
+                with override_settings(CACHES=config):
+                    cache = caches['default']
+                    cache.clear()
+                    client = Client()
+                    samples = timed(
+                        lambda: client.get(url, {'page': next(pages)}),
+                        options['requests'],
+                    )
+                    results[name] = summarize(samples)
+                    if hasattr(cache, 'stats'):
+                        results[name]['cache'] = cache.stats()
+                    cache.clear()
+        self.stdout.write(json.dumps(results, indent=2))
@@ -0,0 +1,142 @@
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.benchmark import summarize
+from core.sqlite import pragma_statements
+
+SCHEMA = """
+CREATE TABLE author (id INTEGER PRIMARY KEY, username TEXT NOT NULL);
+CREATE TABLE post (
+    id INTEGER PRIMARY KEY,
+    text TEXT NOT NULL,
+    pub_date REAL NOT NULL,
+    author_id INTEGER NOT NULL REFERENCES author (id)
+);
+CREATE INDEX post_pub_date ON post (pub_date);
+"""
+# Та же форма, что у страницы списка: JOIN автора, сортировка, LIMIT.
+READ_SQL = """
+SELECT post.id, post.text, post.pub_date, author.username
+FROM post JOIN author ON author.id = post.author_id
+ORDER BY post.pub_date DESC LIMIT 10 OFFSET ?
+"""
+WRITE_SQL = 'INSERT INTO post (text, pub_date, author_id) VALUES (?, ?, ?)'
+AUTHORS = 100
+
+
+class Command(BaseCommand):
+    help = ('Чтение страниц списка при параллельной записи: журнал SQLite '
+            'по умолчанию и новое соединение на запрос против '
+            'settings.SQLITE_PRAGMAS и постоянных соединений.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4,
+                            help='Потоки чтения.')
+        parser.add_argument('--writers', type=int, default=1,
+                            help='Потоки записи.')
+        parser.add_argument('--seconds', type=float, default=5.0,
+                            help='Длительность каждого прогона.')
+        parser.add_argument('--posts', type=int, default=5000,
+                            help='Постов в базе перед прогоном.')
+
+    def handle(self, *args, **options):
+        profiles = {
+            'default': ([], False),
+            'tuned': (pragma_statements(settings.SQLITE_PRAGMAS), True),
+        }
+        results = {}
+        with tempfile.TemporaryDirectory() as directory:
+            for name, (pragmas, persistent) in profiles.items():
+                path = os.path.join(directory, f'{name}.sqlite3')
+                self.prepare(path, options['posts'])
+                results[name] = self.run(path, pragmas, persistent, options)
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def prepare(self, path, posts):
+        conn = sqlite3.connect(path)
+        conn.executescript(SCHEMA)
+        conn.executemany('INSERT INTO author (username) VALUES (?)',
+                         [(f'author{i}',) for i in range(AUTHORS)])
+        conn.executemany(WRITE_SQL, self.rows(posts))
+        conn.commit()
+        conn.close()
+
+    def rows(self, count):
+        now = time.time()
+        for i in range(count):
+            yield (f'Пост {i} ' * 20, now + i, random.randint(1, AUTHORS))
+
+    def connect(self, path, pragmas):
+        conn = sqlite3.connect(path, check_same_thread=False)
+        for statement in pragmas:
+            conn.execute(statement)
+        return conn
+
+    def read(self, state):
+        persistent = self.connect(state['path'], state['pragmas']) \
+            if state['persistent'] else None
+        samples = []
+        while time.monotonic() < state['deadline']:
+            start = time.perf_counter()
+            conn = persistent or self.connect(state['path'],
+                                              state['pragmas'])
+            try:
+                conn.execute(
+                    READ_SQL, (random.randint(0, 50) * 10,)).fetchall()
+                samples.append(time.perf_counter() - start)
+            except sqlite3.OperationalError:
+                self.count(state, 'errors')
+            finally:
+                if conn is not persistent:
+                    conn.close()
+        if persistent is not None:
+            persistent.close()
+        with state['lock']:
+            state['samples'].extend(samples)
+
+    def write(self, state):
+        conn = self.connect(state['path'], state['pragmas'])
+        while time.monotonic() < state['deadline']:
+            try:
+                with conn:
+                    conn.executemany(WRITE_SQL, self.rows(5))
+                self.count(state, 'writes')
+            except sqlite3.OperationalError:
+                self.count(state, 'errors')
+        conn.close()
+
+    def count(self, state, name):
+        with state['lock']:
+            state[name] += 1
+
+    def run(self, path, pragmas, persistent, options):
+        # WAL включается в файле базы и сохраняется в нём.
+        self.connect(path, pragmas).close()
+        state = {
+            'path': path, 'pragmas': pragmas, 'persistent': persistent,
+            'deadline': time.monotonic() + options['seconds'],
+            'lock': threading.Lock(), 'samples': [],
+            'writes': 0, 'errors': 0,
+        }
+        threads = ([threading.Thread(target=self.read, args=(state,))
+                    for _ in range(options['readers'])]
+                   + [threading.Thread(target=self.write, args=(state,))
+                      for _ in range(options['writers'])])
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        result = summarize(state['samples'])
+        result['reads_per_second'] = round(
+            len(state['samples']) / options['seconds'], 1)
+        result['writes'] = state['writes']
+        result['errors'] = state['errors']
+        return result
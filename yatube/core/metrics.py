@@ -0,0 +1,262 @@
+"""Метрики в текстовом формате Prometheus для нескольких процессов.
+
+Каждый процесс копит счётчики и гистограммы в памяти и не чаще раза
+в ``METRICS_FLUSH_INTERVAL`` секунд сбрасывает их в свой файл в
+``METRICS_DIR``. Страница ``/metrics`` суммирует файлы всех процессов,
+так что любой воркер отдаёт общую картину и ни разу не ходит в БД.
+Файлы завершившихся процессов остаются в сумме, поэтому каталог
+очищают при перезапуске сервиса, как в multiprocess-режиме
+prometheus_client.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0)
+# Имя -> (тип, описание).
+METRICS = {
+    'yatube_http_requests_total': (
+        'counter', 'HTTP-запросы по вьюхам, методам и статусам.'),
+    'yatube_http_request_duration_seconds': (
+        'histogram', 'Время ответа по вьюхам.'),
+    'yatube_db_sampled_requests_total': (
+        'counter', 'Запросы с замером SQL (см. REQUEST_INSTRUMENTATION).'),
+    'yatube_db_queries_total': (
+        'counter', 'SQL-запросы в запросах с замером.'),
+    'yatube_db_query_seconds_total': (
+        'counter', 'Время SQL в запросах с замером.'),
+    'yatube_db_n_plus_one_total': (
+        'counter', 'Запросы с повторяющимися SELECT (N+1).'),
+    'yatube_cache_requests_total': (
+        'counter', 'Обращения к кешу по результату.'),
+    'yatube_cache_hit_ratio': (
+        'gauge', 'Доля попаданий в кеш (оба уровня).'),
+    'yatube_thumbnails_generated_total': (
+        'counter', 'Созданные варианты картинок.'),
+    'yatube_thumbnail_failures_total': (
+        'counter', 'Картинки, для которых не удалось создать варианты.'),
+    'yatube_thumbnail_generation_seconds': (
+        'histogram', 'Время создания всех вариантов одной картинки.'),
+}
+
+
+def _key(labels):
+    return tuple(sorted((str(k), str(v)) for k, v in labels.items()))
+
+
+class Registry:
+    """Метрики текущего процесса и их сброс в файл."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._collectors = []
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        # pid может достаться новому процессу: добавляем случайный хвост.
+        self._file_id = f'{self._pid}-{uuid.uuid4().hex[:8]}'
+        self._values = {}
+        self._histograms = {}
+        self._flushed = 0.0
+
+    def _check_fork(self):
+        if os.getpid() != self._pid:
+            self._reset()
+
+    def add_collector(self, func):
+        """``func()`` возвращает [(имя, labels, значение)] на момент сбора."""
+        self._collectors.append(func)
+        return func
+
+    def inc(self, name, value=1, **labels):
+        with self._lock:
+            self._check_fork()
+            key = (name, _key(labels))
+            self._values[key] = self._values.get(key, 0) + value
+
+    def observe(self, name, value, buckets=DEFAULT_BUCKETS, **labels):
+        with self._lock:
+            self._check_fork()
+            key = (name, _key(labels))
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {
+                    'buckets': list(buckets),
+                    'counts': [0] * len(buckets),
+                    'sum': 0.0,
+                    'count': 0,
+                }
+            for i, bound in enumerate(histogram['buckets']):
+                if value <= bound:
+                    histogram['counts'][i] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            self._check_fork()
+            values = dict(self._values)
+            histograms = {key: dict(h, counts=list(h['counts']))
+                          for key, h in self._histograms.items()}
+        for collector in self._collectors:
+            for name, labels, value in collector():
+                key = (name, _key(labels))
+                values[key] = values.get(key, 0) + value
+        return {
+            'values': [[name, labels, value]
+                       for (name, labels), value in values.items()],
+            'histograms': [[name, labels, h]
+                           for (name, labels), h in histograms.items()],
+        }
+
+    def directory(self):
+        return settings.METRICS_DIR
+
+    def flush(self, force=False):
+        # До имени файла: дочерний процесс после fork, начавший с
+        # collect(), иначе перезапишет файл родителя.
+        with self._lock:
+            self._check_fork()
+        now = time.monotonic()
+        interval = settings.METRICS_FLUSH_INTERVAL
+        if not force and now - self._flushed < interval:
+            return
+        self._flushed = now
+        directory = self.directory()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{self._file_id}.json')
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def collect(self):
+        """Сумма метрик всех процессов."""
+        self.flush(force=True)
+        values = {}
+        histograms = {}
+        directory = self.directory()
+        for filename in sorted(os.listdir(directory)):
+            if not filename.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(directory, filename)) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for name, labels, value in data['values']:
+                key = (name, tuple(map(tuple, labels)))
+                values[key] = values.get(key, 0) + value
+            for name, labels, h in data['histograms']:
+                key = (name, tuple(map(tuple, labels)))
+                total = histograms.setdefault(key, {
+                    'buckets': h['buckets'],
+                    'counts': [0] * len(h['buckets']),
+                    'sum': 0.0, 'count': 0,
+                })
+                total['counts'] = [a + b for a, b in
+                                   zip(total['counts'], h['counts'])]
+                total['sum'] += h['sum']
+                total['count'] += h['count']
+        return values, histograms
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    body = ','.join(
+        '{}="{}"'.format(k, str(v).replace('\\', '\\\\')
+                         .replace('"', '\\"').replace('\n', '\\n'))
+        for k, v in pairs
+    )
+    return '{' + body + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def cache_hit_ratio(values):
+    totals = {}
+    for (name, labels), value in values.items():
+        if name == 'yatube_cache_requests_total':
+            result = dict(labels)['result']
+            totals[result] = totals.get(result, 0) + value
+    requests = sum(totals.values())
+    if not requests:
+        return None
+    hits = totals.get('local_hit', 0) + totals.get('shared_hit', 0)
+    return hits / requests
+
+
+def render(values, histograms):
+    """Текстовый формат экспозиции Prometheus 0.0.4."""
+    ratio = cache_hit_ratio(values)
+    if ratio is not None:
+        values = dict(values)
+        values[('yatube_cache_hit_ratio', ())] = ratio
+    by_name = {}
+    for (name, labels), value in values.items():
+        by_name.setdefault(name, []).append((labels, value))
+    for (name, labels), h in histograms.items():
+        by_name.setdefault(name, []).append((labels, h))
+    lines = []
+    for name in sorted(by_name):
+        kind, description = METRICS.get(name, ('untyped', name))
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in sorted(by_name[name], key=lambda x: x[0]):
+            if kind != 'histogram':
+                lines.append(f'{name}{_labels(labels)} {_number(value)}')
+                continue
+            # counts уже накопительные: observe() считает value <= le.
+            for bound, count in zip(value['buckets'], value['counts']):
+                lines.append(
+                    f'{name}_bucket{_labels(labels, [("le", bound)])} '
+                    f'{count}'
+                )
+            lines.append(f'{name}_bucket{_labels(labels, [("le", "+Inf")])}'
+                         f' {value["count"]}')
+            lines.append(f'{name}_sum{_labels(labels)} '
+                         f'{_number(value["sum"])}')
+            lines.append(f'{name}_count{_labels(labels)} {value["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+@registry.add_collector
+def cache_stats():
+    from django.core.cache import cache
+    if not hasattr(cache, 'stats'):
+        return []
+    stats = cache.stats()
+    return [
+        ('yatube_cache_requests_total', {'result': result}, stats[field])
+        for result, field in (('local_hit', 'local_hits'),
+                              ('shared_hit', 'shared_hits'),
+                              ('miss', 'misses'))
+    ]
+
+
+@registry.add_collector
+def db_stats():
+    from .instrumentation import aggregates
+    values = []
+    for view, row in aggregates.snapshot().items():
+        labels = {'view': view}
+        values += [
+            ('yatube_db_sampled_requests_total', labels, row['requests']),
+            ('yatube_db_queries_total', labels, row['queries']),
+            ('yatube_db_query_seconds_total', labels, row['sql_seconds']),
+            ('yatube_db_n_plus_one_total', labels, row['n_plus_one']),
+        ]
+    return values
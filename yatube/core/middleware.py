@@ -0,0 +1,113 @@
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from .instrumentation import QueryRecorder, aggregates
+from .metrics import registry
+
+logger = logging.getLogger('core.instrumentation')
+
+DEFAULTS = {
+    # Доля запросов с замером; 0 - выключено.
+    'SAMPLE_RATE': 0.0,
+    'SLOW_REQUEST_MS': 500,
+    # Сколько одинаковых SELECT за запрос считать N+1.
+    'N_PLUS_ONE_THRESHOLD': 5,
+    'SERVER_TIMING': False,
+}
+
+
+def instrumentation_settings():
+    return {**DEFAULTS, **getattr(settings, 'REQUEST_INSTRUMENTATION', {})}
+
+
+class MetricsMiddleware:
+    """Счётчик и гистограмма времени ответа по вьюхам для /metrics."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        response = self.get_response(request)
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        registry.inc('yatube_http_requests_total', view=view,
+                     method=request.method, status=response.status_code)
+        registry.observe('yatube_http_request_duration_seconds',
+                         time.perf_counter() - start, view=view)
+        registry.flush()
+        return response
+
+
+class QueryInstrumentationMiddleware:
+    """Число и время SQL-запросов, время шаблонов и поиск N+1.
+
+    Без выборки (``SAMPLE_RATE`` = 0) стоит одно сравнение на запрос.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        options = instrumentation_settings()
+        rate = options['SAMPLE_RATE']
+        if not rate or (rate < 1 and random.random() >= rate):
+            return self.get_response(request)
+        recorder = QueryRecorder()
+        request._render_seconds = 0.0
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+        self.record(request, response, recorder, total, options)
+        return response
+
+    def process_template_response(self, request, response):
+        if hasattr(request, '_render_seconds'):
+            start = time.perf_counter()
+
+            def rendered(response):
+                request._render_seconds += time.perf_counter() - start
+            response.add_post_render_callback(rendered)
+        return response
+
+    def record(self, request, response, recorder, total, options):
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        repeated = recorder.repeated(options['N_PLUS_ONE_THRESHOLD'])
+        slow = total * 1000 >= options['SLOW_REQUEST_MS']
+        aggregates.add(
+            view,
+            queries=recorder.count,
+            sql_seconds=recorder.duration,
+            render_seconds=request._render_seconds,
+            total_seconds=total,
+            slow=int(slow),
+            n_plus_one=int(bool(repeated)),
+        )
+        if repeated:
+            logger.warning(
+                'N+1 во вьюхе %s: %s', view,
+                '; '.join(f'{count}x {sql[:200]}' for sql, count in repeated)
+            )
+        if slow:
+            logger.warning(
+                'Медленный запрос %s %s (%s): %.0f мс, SQL %d шт. за '
+                '%.0f мс, шаблоны %.0f мс',
+                request.method, request.path, view, total * 1000,
+                recorder.count, recorder.duration * 1000,
+                request._render_seconds * 1000,
+            )
+        if options['SERVER_TIMING']:
+            response['Server-Timing'] = (
+                f'db;dur={recorder.duration * 1000:.1f}, '
+                f'render;dur={request._render_seconds * 1000:.1f}, '
+                f'total;dur={total * 1000:.1f}'
+            )
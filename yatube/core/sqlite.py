@@ -0,0 +1,26 @@
+"""Настройка соединений SQLite для работы под нагрузкой.
+
+При каждом новом соединении выполняются PRAGMA из
+``settings.SQLITE_PRAGMAS``. В режиме WAL читатели не ждут писателя,
+``busy_timeout`` заставляет писателей ждать друг друга вместо ошибки
+``database is locked``, а ``mmap_size`` и ``cache_size`` держат горячие
+страницы в памяти. Соединения переиспользуются между запросами через
+``CONN_MAX_AGE``, поэтому PRAGMA выполняются редко.
+"""
+from django.conf import settings
+
+
+def pragma_statements(pragmas):
+    return [f'PRAGMA {name} = {value}' for name, value in pragmas.items()]
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    """Обработчик сигнала ``connection_created``."""
+    if connection.vendor != 'sqlite':
+        return
+    # PRAGMAS в настройках базы дополняют общие, например для шардов.
+    pragmas = {**settings.SQLITE_PRAGMAS,
+               **connection.settings_dict.get('PRAGMAS', {})}
+    with connection.cursor() as cursor:
+        for statement in pragma_statements(pragmas):
+            cursor.execute(statement)
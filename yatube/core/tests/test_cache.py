@@ -0,0 +1,71 @@
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+
+TIERED_CACHES = {
+    'default': {
+        'BACKEND': 'core.cache.TieredCache',
+        'LOCATION': 'test_shared',
+        'OPTIONS': {
+            'LOCAL_MAX_ENTRIES': 3,
+            'LOCAL_MAX_BYTES': 1024,
+            'LOCAL_SKIP_PREFIXES': ('skip:',),
+        },
+    },
+    'test_shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tiered-test-shared',
+    },
+}
+
+
+@override_settings(CACHES=TIERED_CACHES)
+class TieredCacheTest(TestCase):
+    def setUp(self):
+        self.cache = caches['default']
+        self.shared = caches['test_shared']
+        self.cache.clear()
+
+    def test_get_goes_through_levels(self):
+        """Промах, затем попадание в общий кеш, затем в локальный."""
+        before = self.cache.stats()
+        self.assertIsNone(self.cache.get('key'))
+        self.shared.set('key', 'value')
+        self.assertEqual(self.cache.get('key'), 'value')
+        self.shared.delete('key')
+        self.assertEqual(self.cache.get('key'), 'value')
+        after = self.cache.stats()
+        self.assertEqual(
+            [after[name] - before[name]
+             for name in ('misses', 'shared_hits', 'local_hits')],
+            [1, 1, 1],
+        )
+
+    def test_lru_bounds(self):
+        """Локальный уровень хранит не больше LOCAL_MAX_ENTRIES записей."""
+        self.cache.set_many({f'key{i}': i for i in range(5)})
+        self.assertEqual(self.cache.stats()['local_entries'], 3)
+        self.assertEqual(self.cache.get_many([f'key{i}' for i in range(5)]),
+                         {f'key{i}': i for i in range(5)})
+
+    def test_delete_and_incr_drop_local_copy(self):
+        """delete и incr не оставляют устаревших локальных копий."""
+        self.cache.set('counter', 1)
+        self.cache.incr('counter')
+        self.assertEqual(self.cache.get('counter'), 2)
+        self.cache.delete('counter')
+        self.assertIsNone(self.cache.get('counter'))
+
+    def test_skip_prefixes_read_shared(self):
+        """Ключи из LOCAL_SKIP_PREFIXES не кешируются локально."""
+        self.cache.set('skip:version', 1)
+        self.shared.set('skip:version', 2)
+        self.assertEqual(self.cache.get('skip:version'), 2)
+
+    def test_unstored_value_drops_local_copy(self):
+        """Слишком большое значение или timeout=0 убирают старую копию."""
+        for key, kwargs in (('big', {'value': 'x' * 2048}),
+                            ('zero', {'value': 'new', 'timeout': 0})):
+            with self.subTest(key=key):
+                self.cache.set(key, 'old')
+                self.cache.set(key, **kwargs)
+                self.assertNotEqual(self.cache.get(key), 'old')
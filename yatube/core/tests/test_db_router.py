@@ -0,0 +1,78 @@
+from django.db import transaction
+from django.http import HttpResponse
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+from posts.models import Post, User
+
+from ..db_router import (STICKY_COOKIE, ReplicaRouter,
+                         ReplicaRoutingMiddleware, pin_to_primary)
+
+REPLICAS = ['replica1', 'replica2']
+
+
+@override_settings(DATABASE_REPLICAS=REPLICAS, REPLICA_STICKY_SECONDS=30)
+class ReplicaRouterTest(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def test_reads_go_to_replicas(self):
+        """Без записи чтения уходят на реплики, запись - в default."""
+        with pin_to_primary(False):
+            self.assertIn(self.router.db_for_read(Post), REPLICAS)
+            self.assertEqual(self.router.db_for_write(Post), 'default')
+            # После записи поток читает своё из основной базы.
+            self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_no_replicas(self):
+        """Без реплик всё идёт в default."""
+        with override_settings(DATABASE_REPLICAS=[]), pin_to_primary(False):
+            self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_migrations_skip_replicas(self):
+        self.assertTrue(self.router.allow_migrate('default', 'posts'))
+        self.assertFalse(self.router.allow_migrate('replica1', 'posts'))
+
+    def run_middleware(self, request, view):
+        def get_response(request):
+            response = HttpResponse()
+            response.db = view()
+            return response
+        return ReplicaRoutingMiddleware(get_response)(request)
+
+    def test_write_sets_sticky_cookie(self):
+        """Запрос с записью ставит cookie, и следующий читает default."""
+        def write():
+            self.router.db_for_write(User)
+            return self.router.db_for_read(Post)
+
+        response = self.run_middleware(self.factory.get('/'), write)
+        self.assertEqual(response.db, 'default')
+        self.assertEqual(response.cookies[STICKY_COOKIE]['max-age'], 30)
+
+        request = self.factory.get('/')
+        request.COOKIES[STICKY_COOKIE] = '1'
+        response = self.run_middleware(
+            request, lambda: self.router.db_for_read(Post))
+        self.assertEqual(response.db, 'default')
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_reads_without_cookie_use_replica(self):
+        """Чтение без cookie и записи идёт на реплику."""
+        response = self.run_middleware(
+            self.factory.get('/'), lambda: self.router.db_for_read(Post))
+        self.assertIn(response.db, REPLICAS)
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_unsafe_method_is_pinned(self):
+        response = self.run_middleware(
+            self.factory.post('/'), lambda: self.router.db_for_read(Post))
+        self.assertEqual(response.db, 'default')
+
+
+@override_settings(DATABASE_REPLICAS=REPLICAS)
+class ReplicaRouterAtomicTest(TestCase):
+    def test_atomic_reads_primary(self):
+        """Внутри транзакции чтения идут в default."""
+        with pin_to_primary(False), transaction.atomic():
+            self.assertEqual(ReplicaRouter().db_for_read(Post), 'default')
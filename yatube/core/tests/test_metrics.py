@@ -0,0 +1,82 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from posts.models import Post, User
+
+from ..metrics import registry
+
+METRICS_DIR = tempfile.mkdtemp()
+
+
+@override_settings(METRICS_DIR=METRICS_DIR, METRICS_TOKEN='secret')
+class MetricsEndpointTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(METRICS_DIR, ignore_errors=True)
+
+    def test_request_metrics_by_view(self):
+        """Запросы видны в /metrics с меткой вьюхи, страница без БД."""
+        author = User.objects.create_user(username='author')
+        Post.objects.create(text='Пост', author=author)
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('about:author'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('metrics'),
+                                       HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        body = response.content.decode()
+        self.assertIn('# TYPE yatube_http_requests_total counter', body)
+        self.assertRegex(
+            body, r'yatube_http_requests_total\{method="GET",'
+                  r'status="200",view="posts:index"\} \d+')
+        self.assertIn('view="about:author"', body)
+        self.assertRegex(
+            body, r'yatube_http_request_duration_seconds_bucket\{'
+                  r'view="posts:index",le="\+Inf"\} \d+')
+        self.assertIn('yatube_cache_hit_ratio', body)
+
+    def test_access_restricted(self):
+        """Без токена метрики видят только сотрудники."""
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        response = self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, 302)
+        self.client.force_login(
+            User.objects.create_user(username='admin', is_staff=True))
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_sums_files_of_all_processes(self):
+        """Метрики других процессов суммируются с текущими."""
+        registry.inc('yatube_thumbnails_generated_total', 2)
+        before = self.generated()
+        other = {
+            'values': [['yatube_thumbnails_generated_total', [], 5]],
+            'histograms': [],
+        }
+        with open(os.path.join(METRICS_DIR, 'other-1.json'), 'w') as f:
+            json.dump(other, f)
+        self.assertEqual(self.generated(), before + 5)
+        os.remove(os.path.join(METRICS_DIR, 'other-1.json'))
+
+    def test_forked_child_writes_own_file(self):
+        """Первый collect() после fork не трогает файл родителя."""
+        registry.flush(force=True)
+        parent = os.path.join(METRICS_DIR, f'{registry._file_id}.json')
+        with open(parent) as f:
+            saved = f.read()
+        # Так выглядит реестр в дочернем процессе: pid уже другой.
+        registry._pid = -1
+        registry.collect()
+        with open(parent) as f:
+            self.assertEqual(f.read(), saved)
+        self.assertNotIn(registry._file_id, parent)
+
+    def generated(self):
+        values, _ = registry.collect()
+        return values[('yatube_thumbnails_generated_total', ())]
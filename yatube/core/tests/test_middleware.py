@@ -0,0 +1,74 @@
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from posts.models import Group, Post, User
+
+from ..instrumentation import aggregates, fingerprint
+from ..middleware import QueryInstrumentationMiddleware
+
+SAMPLE_ALL = {
+    'SAMPLE_RATE': 1.0,
+    'SLOW_REQUEST_MS': 0,
+    'N_PLUS_ONE_THRESHOLD': 3,
+    'SERVER_TIMING': True,
+}
+
+
+class QueryInstrumentationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for i in range(4):
+            author = User.objects.create_user(username=f'author{i}')
+            group = Group.objects.create(title=f'Группа {i}', slug=f'g{i}',
+                                         description='Описание')
+            Post.objects.create(text=f'Пост {i}', author=author,
+                                group=group)
+
+    def setUp(self):
+        cache.clear()
+        aggregates.reset()
+
+    def test_fingerprint(self):
+        """Отпечаток не зависит от чисел и длины IN-списка."""
+        self.assertEqual(
+            fingerprint('SELECT * FROM t WHERE id = 5 AND x IN (%s, %s)'),
+            fingerprint('SELECT  * FROM t WHERE id = 7 AND x IN (%s)'),
+        )
+
+    @override_settings(REQUEST_INSTRUMENTATION=SAMPLE_ALL)
+    def test_request_recorded(self):
+        """Запрос попадает в сводку, медленный запрос - в лог."""
+        with self.assertLogs('core.instrumentation', 'WARNING') as logs:
+            response = self.client.get(reverse('posts:index'))
+        row = aggregates.snapshot()['posts:index']
+        self.assertEqual(row['requests'], 1)
+        self.assertGreater(row['queries'], 0)
+        self.assertGreater(row['render_seconds'], 0)
+        self.assertGreaterEqual(row['total_seconds'], row['sql_seconds'])
+        self.assertEqual(row['slow'], 1)
+        self.assertEqual(row['n_plus_one'], 0)
+        self.assertTrue(any('Медленный' in line for line in logs.output))
+        self.assertIn('db;dur=', response['Server-Timing'])
+
+    @override_settings(REQUEST_INSTRUMENTATION=SAMPLE_ALL)
+    def test_n_plus_one_flagged(self):
+        """Одинаковые SELECT в цикле помечаются как N+1."""
+        def view(request):
+            for post in Post.objects.all():
+                post.author.username
+            return HttpResponse()
+
+        middleware = QueryInstrumentationMiddleware(view)
+        with self.assertLogs('core.instrumentation', 'WARNING') as logs:
+            middleware(RequestFactory().get('/'))
+        self.assertEqual(aggregates.snapshot()['unresolved']['n_plus_one'], 1)
+        self.assertTrue(any('N+1' in line for line in logs.output))
+
+    @override_settings(REQUEST_INSTRUMENTATION={'SAMPLE_RATE': 0})
+    def test_sampling_off(self):
+        """Без выборки ничего не записывается."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(aggregates.snapshot(), {})
+        self.assertNotIn('Server-Timing', response)
@@ -1,4 +1,10 @@
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+
+from .metrics import registry, render as render_metrics
 
 
 def page_not_found(request, exception):
@@ -7,3 +13,22 @@ def page_not_found(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'pwd/403csrf.html')
+
+
+def _metrics_response(request):
+    return HttpResponse(render_metrics(*registry.collect()),
+                        content_type='text/plain; version=0.0.4; '
+                                     'charset=utf-8')
+
+
+def metrics(request):
+    """Метрики всех процессов для Prometheus.
+
+    Доступ - сотрудникам или с ``Authorization: Bearer <METRICS_TOKEN>``;
+    по токену страница отдаётся без обращений к БД.
+    """
+    token = settings.METRICS_TOKEN
+    if token and constant_time_compare(
+            request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'):
+        return _metrics_response(request)
+    return staff_member_required(_metrics_response)(request)
@@ -5,7 +5,10 @@ import sys
 
 
 def main():
-    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+    # Тестам нужны отдельные настройки: см. yatube/settings_test.py.
+    settings = 'yatube.settings_test' if sys.argv[1:2] == ['test'] \
+        else 'yatube.settings'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings)
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
@@ -0,0 +1,73 @@
+"""Версии кеша списков постов.
+
+Фрагменты списков кешируются под ключом, в который входит версия.
+Сигналы сохранения и удаления постов и групп меняют версию, поэтому
+записи могут жить долго и всё равно сразу устаревают после изменений.
+
+Версия - случайная строка, которую пишет ``set``: ``incr`` файлового
+кеша читает и перезаписывает файл без блокировки, и одновременные
+сбросы из двух процессов теряли бы один из них. Каждый ``set`` даёт
+новое значение, поэтому сброс не пропадает, какой бы из них ни записался
+последним.
+"""
+import uuid
+
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.utils.translation import get_language
+
+LISTING_VERSION_KEY = 'posts:listing_version'
+USER_VERSION_KEY = 'posts:user_version:{}'
+
+
+def _new_version():
+    return uuid.uuid4().hex
+
+
+def _get_version(key):
+    version = cache.get(key)
+    if version is None:
+        # Вытесненный ключ получает новое значение: старые фрагменты не
+        # станут снова актуальными.
+        cache.add(key, _new_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def _bump_version(key):
+    version = _new_version()
+    cache.set(key, version, None)
+    return version
+
+
+def get_listing_version():
+    return _get_version(LISTING_VERSION_KEY)
+
+
+def bump_listing_version():
+    return _bump_version(LISTING_VERSION_KEY)
+
+
+def get_user_version(user_id):
+    """Версия личных данных пользователя (его подписок)."""
+    return _get_version(USER_VERSION_KEY.format(user_id))
+
+
+def bump_user_version(user_id):
+    return _bump_version(USER_VERSION_KEY.format(user_id))
+
+
+def listing_fragment_key(request, personal=False):
+    """Ключ фрагмента: вьюха, страница или курсор, язык и версия."""
+    match = request.resolver_match
+    vary_on = [
+        get_listing_version(),
+        match.view_name if match else request.path,
+        sorted(match.kwargs.items()) if match else '',
+        request.GET.get('page', ''),
+        request.GET.get('cursor', ''),
+        get_language(),
+    ]
+    if personal:
+        vary_on += [request.user.pk, get_user_version(request.user.pk)]
+    return make_template_fragment_key('posts_listing', vary_on)
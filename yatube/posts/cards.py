@@ -0,0 +1,70 @@
+"""Кеш отрендеренных карточек постов.
+
+Карточка одинакова во всех списках (главная, группа, профиль, лента
+подписок), поэтому её HTML хранится под ``post_card:<id>`` вместе с
+версией, а страница забирает все карточки одним ``get_many``. Версия -
+отпечаток всего, что выводит карточка: текст, картинка, дата, группа,
+автор и язык. Поэтому и правка в обход сигналов (``QuerySet.update()``)
+не покажет старый HTML; сигналы же сразу удаляют карточки изменённых
+постов, групп и авторов.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from django.utils.translation import get_language
+
+from .models import Post
+from .sharding import shards
+
+CARD_TEMPLATE = 'includes/post_card.html'
+CARD_KEY = 'post_card:{}'
+
+
+def card_key(post_id):
+    return CARD_KEY.format(post_id)
+
+
+def card_version(post):
+    """Отпечаток данных карточки; автор и группа уже загружены
+    списком (``for_listing``)."""
+    author, group = post.author, post.group
+    parts = [post.text, post.image.name, post.pub_date.isoformat(),
+             author.username, author.first_name, author.last_name,
+             get_language()]
+    if group is not None:
+        parts += [group.slug, group.title]
+    return hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+
+def render_cards(posts):
+    """HTML карточек ``posts`` в том же порядке; недостающие
+    рендерятся и кладутся в кеш одним ``set_many``."""
+    posts = list(posts)
+    cached = cache.get_many([card_key(post.pk) for post in posts])
+    cards, missing = [], {}
+    for post in posts:
+        key, version = card_key(post.pk), card_version(post)
+        entry = cached.get(key)
+        if entry is not None and entry[0] == version:
+            html = entry[1]
+        else:
+            html = render_to_string(CARD_TEMPLATE, {'post': post})
+            missing[key] = (version, html)
+        cards.append(mark_safe(html))
+    if missing:
+        cache.set_many(missing, settings.POST_CARD_CACHE_TIMEOUT)
+    return cards
+
+
+def forget_cards(post_ids):
+    cache.delete_many([card_key(post_id) for post_id in post_ids])
+
+
+def forget_cards_where(**lookups):
+    """Удаляет карточки постов, подходящих под ``lookups``."""
+    for alias in shards() or ['default']:
+        forget_cards(Post.objects.using(alias).filter(
+            **lookups).values_list('pk', flat=True))
@@ -0,0 +1,72 @@
+"""Условные GET-запросы для страниц постов.
+
+ETag собирается из версий кеша (см. ``posts.cache``), поэтому для
+проверки не нужен ни шаблон, ни запросы списков: если клиент прислал
+тот же ``If-None-Match``, вьюха сразу отвечает 304.
+"""
+import hashlib
+
+from django.utils.cache import (get_conditional_response,
+                                patch_cache_control, patch_vary_headers)
+from django.utils.http import quote_etag
+from django.utils.translation import get_language
+
+from .cache import get_listing_version, get_user_version
+
+
+class ConditionalGetMixin:
+    """ETag для GET/HEAD; вьюха дополняет его через ``get_etag_parts``.
+
+    Анонимные и авторизованные варианты страницы получают разные
+    ETag: в последний входят id пользователя и версия его подписок.
+    Ответ, одинаковый для всех (``is_personal`` вернул False), получает
+    ETag без пользователя и ``Cache-Control: public``.
+    """
+
+    def is_personal(self):
+        return True
+
+    def get_shared_max_age(self):
+        return 0
+
+    def get_etag_parts(self):
+        return [get_listing_version()]
+
+    def get_etag(self):
+        parts = self.get_etag_parts()
+        if parts is None:
+            return None
+        parts += [self.request.get_full_path(), get_language()]
+        # Сессию не трогаем без нужды: иначе SessionMiddleware добавит
+        # Vary: Cookie и общий кеш не сможет отдавать ответ всем.
+        if self.is_personal() and self.request.user.is_authenticated:
+            user = self.request.user
+            parts += [user.pk, get_user_version(user.pk)]
+        digest = hashlib.md5(
+            '|'.join(map(str, parts)).encode()
+        ).hexdigest()
+        # Слабый ETag: в HTML есть CSRF-токен, байты могут отличаться.
+        return 'W/' + quote_etag(digest)
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+        self.request, self.args, self.kwargs = request, args, kwargs
+        etag = self.get_etag()
+        response = None
+        if etag is not None:
+            response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = super().dispatch(request, *args, **kwargs)
+            if etag is not None and response.status_code == 200:
+                response['ETag'] = etag
+        if etag is None:
+            return response
+        if self.is_personal():
+            patch_vary_headers(response, ('Cookie',))
+            patch_cache_control(response, no_cache=True,
+                                private=request.user.is_authenticated)
+        else:
+            patch_cache_control(response, public=True,
+                                max_age=self.get_shared_max_age())
+        return response
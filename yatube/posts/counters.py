@@ -0,0 +1,129 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Счётчики меняются атомарным ``UPDATE ... SET x = x + 1`` из сигналов,
+а команда ``recount`` пересчитывает их целиком, если они разошлись.
+При шардах посты автора считаются на его шарде отдельным запросом:
+подзапрос из ``default`` их не видит.
+"""
+from django.apps import apps as global_apps
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Post, User, UserCounters
+from .sharding import db_for_post, shard_for_author, shards, sharding_enabled
+
+USER_COUNTERS = {
+    'posts_count': ('posts', 'Post', 'author'),
+    'followers_count': ('posts', 'Follow', 'author'),
+    'following_count': ('posts', 'Follow', 'user'),
+}
+RECOUNT_BATCH_SIZE = 1000
+
+
+def _count_subquery(model, field, outer='pk'):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef(outer)})
+        .order_by().values(field)
+        .annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def _user_counts(apps=global_apps, outer='pk'):
+    counts = {
+        name: _count_subquery(apps.get_model(app, model), field, outer)
+        for name, (app, model, field) in USER_COUNTERS.items()
+    }
+    if sharding_enabled():
+        del counts['posts_count']
+    return counts
+
+
+def bump_post_comments(post_id, delta):
+    Post.objects.using(db_for_post(post_id)).filter(pk=post_id).update(
+        comments_count=F('comments_count') + delta
+    )
+
+
+def bump_user(user_id, **deltas):
+    """Сдвигает счётчики пользователя, например ``posts_count=1``."""
+    updated = UserCounters.objects.filter(user_id=user_id).update(
+        **{name: F(name) + delta for name, delta in deltas.items()}
+    )
+    # Строки ещё нет: создаём её сразу с точными значениями.
+    # При удалении строку не создаём - пользователь может удаляться.
+    if not updated and all(delta > 0 for delta in deltas.values()):
+        create_user_counters(user_id)
+
+
+def create_user_counters(user_id):
+    annotations = _user_counts()
+    counts = User.objects.filter(pk=user_id).annotate(
+        **annotations
+    ).values(*annotations).first()
+    if counts is not None:
+        if sharding_enabled():
+            counts['posts_count'] = Post.objects.using(
+                shard_for_author(user_id)).filter(author_id=user_id).count()
+        UserCounters.objects.get_or_create(user_id=user_id, defaults=counts)
+
+
+def recount_comments(apps=global_apps):
+    """Пересчитывает comments_count у постов, возвращает число правок."""
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    actual = _count_subquery(Comment, 'post')
+    drifted = 0
+    # Комментарии лежат на шарде своего поста: считаем на каждом.
+    for alias in shards() or [DEFAULT_DB_ALIAS]:
+        posts = Post.objects.using(alias)
+        changed = posts.annotate(actual=actual).exclude(
+            comments_count=F('actual')
+        ).count()
+        if changed:
+            posts.update(comments_count=actual)
+        drifted += changed
+    return drifted
+
+
+def recount_users(apps=global_apps):
+    """Создаёт недостающие счётчики пользователей и пересчитывает все."""
+    User = apps.get_model('auth', 'User')
+    UserCounters = apps.get_model('posts', 'UserCounters')
+    missing = User.objects.filter(counters__isnull=True).values_list(
+        'pk', flat=True
+    )
+    UserCounters.objects.bulk_create(
+        (UserCounters(user_id=pk) for pk in missing.iterator()),
+        batch_size=RECOUNT_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    counts = _user_counts(apps, outer='user_id')
+    drifted = UserCounters.objects.annotate(
+        **{f'actual_{name}': value for name, value in counts.items()}
+    ).exclude(
+        **{name: F(f'actual_{name}') for name in counts}
+    ).count()
+    if drifted:
+        UserCounters.objects.update(**counts)
+    if sharding_enabled():
+        drifted += _recount_shard_posts(apps.get_model('posts', 'Post'),
+                                        UserCounters)
+    return drifted
+
+
+def _recount_shard_posts(Post, UserCounters):
+    """posts_count по шардам; возвращает число исправленных строк."""
+    actual = {}
+    for alias in shards():
+        actual.update(Post.objects.using(alias).order_by().values_list(
+            'author_id').annotate(total=Count('pk')))
+    drifted = [
+        UserCounters(user_id=user_id, posts_count=actual.get(user_id, 0))
+        for user_id, stored in UserCounters.objects.values_list(
+            'user_id', 'posts_count').iterator()
+        if stored != actual.get(user_id, 0)
+    ]
+    UserCounters.objects.bulk_update(drifted, ['posts_count'],
+                                     batch_size=RECOUNT_BATCH_SIZE)
+    return len(drifted)
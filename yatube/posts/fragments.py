@@ -0,0 +1,61 @@
+"""Режим фрагментов для лент: только карточки постов и курсор дальше.
+
+С ``?fragment=1`` вьюха ленты вместо всей страницы отдаёт карточки
+(``includes/post_list.html``) и маркер ``data-feed-next`` со ссылкой
+на следующую порцию. Фрагменты всегда листаются курсором. Общие для
+всех ленты (главная, группа, профиль) отдают фрагменты без привязки к
+пользователю: ETag без id пользователя и ``Cache-Control: public``,
+так что их можно хранить в общем кеше отдельно от страницы.
+"""
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+
+from .utils import CursorPaginator
+
+
+class FeedFragmentMixin:
+    fragment_kwarg = 'fragment'
+    fragment_template_name = 'posts/feed_fragment.html'
+    # Лента зависит от пользователя: фрагменты остаются private.
+    personal_feed = False
+
+    def is_fragment(self):
+        return self.request.GET.get(self.fragment_kwarg) == '1'
+
+    def is_personal(self):
+        return self.personal_feed or not self.is_fragment()
+
+    def get_shared_max_age(self):
+        return settings.FEED_FRAGMENT_MAX_AGE
+
+    def get_template_names(self):
+        if self.is_fragment():
+            return [self.fragment_template_name]
+        return super().get_template_names()
+
+    def paginate_queryset(self, queryset, page_size):
+        if self.is_fragment():
+            self.cursor_pagination = True
+        return super().paginate_queryset(queryset, page_size)
+
+    def next_fragment_url(self, page, queryset):
+        """Ссылка на фрагмент после последнего поста страницы."""
+        if not page.has_next():
+            return None
+        if getattr(page, 'is_cursor', False):
+            cursor = page.next_cursor
+        else:
+            paginator = CursorPaginator(queryset, page.paginator.per_page,
+                                        ordering=self.cursor_ordering)
+            cursor = paginator.encode_cursor(page[len(page) - 1])
+        return f'?{self.fragment_kwarg}=1&{self.cursor_kwarg}={cursor}'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        page, queryset = context['page_obj'], self.object_list
+        # Ссылка считается внутри listing_cache: при попадании в кеш
+        # посты страницы ради курсора не читаются.
+        context['next_fragment_url'] = SimpleLazyObject(
+            lambda: self.next_fragment_url(page, queryset))
+        context['personal_feed'] = self.personal_feed
+        return context
@@ -0,0 +1,165 @@
+"""Граф подписок в памяти процесса и рекомендации «кого читать».
+
+Граф хранится в формате CSR: ``targets`` - id авторов всех подписок,
+отсортированные по (подписчик, автор), ``offsets[u]:offsets[u + 1]`` -
+отрезок подписок пользователя ``u``. Оба массива - ``array`` целых,
+около 4 байт на подписку против сотен байт у множеств Python.
+
+Сигналы подписки и отписки правят граф текущего процесса через
+небольшой оверлей (``_added``/``_removed``), а не пересобирают массивы.
+Другие процессы увидят изменения при пересборке: граф старше
+``settings.FOLLOW_GRAPH_MAX_AGE`` секунд строится из ``Follow`` заново.
+"""
+import heapq
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+from django.conf import settings
+
+from .models import Follow
+
+
+class FollowGraph:
+    def __init__(self, offsets, targets, in_degree):
+        self.offsets = offsets
+        self.targets = targets
+        self.in_degree = in_degree
+        self._added = {}
+        self._removed = {}
+        self.built_at = time.monotonic()
+
+    @classmethod
+    def from_pairs(cls, pairs):
+        """Граф из пар (подписчик, автор), отсортированных по паре."""
+        offsets = array('q')
+        targets = array('i')
+        for user_id, author_id in pairs:
+            while len(offsets) <= user_id:
+                offsets.append(len(targets))
+            targets.append(author_id)
+        offsets.append(len(targets))
+        in_degree = array('i', [0]) * (max(targets, default=0) + 1)
+        for author_id in targets:
+            in_degree[author_id] += 1
+        return cls(offsets, targets, in_degree)
+
+    @classmethod
+    def load(cls):
+        pairs = Follow.objects.order_by('user_id', 'author_id').values_list(
+            'user_id', 'author_id')
+        return cls.from_pairs(pairs.iterator(chunk_size=10000))
+
+    def _bounds(self, user_id):
+        if user_id + 1 < len(self.offsets):
+            return self.offsets[user_id], self.offsets[user_id + 1]
+        return 0, 0
+
+    def _in_base(self, user_id, author_id):
+        lo, hi = self._bounds(user_id)
+        index = bisect_left(self.targets, author_id, lo, hi)
+        return index < hi and self.targets[index] == author_id
+
+    def following(self, user_id):
+        """Авторы, на которых подписан пользователь."""
+        lo, hi = self._bounds(user_id)
+        removed = self._removed.get(user_id, ())
+        for author_id in self.targets[lo:hi]:
+            if author_id not in removed:
+                yield author_id
+        yield from self._added.get(user_id, ())
+
+    def followers_count(self, author_id):
+        if author_id < len(self.in_degree):
+            return self.in_degree[author_id]
+        return 0
+
+    def _bump(self, author_id, delta):
+        missing = author_id + 1 - len(self.in_degree)
+        if missing > 0:
+            self.in_degree.extend([0] * missing)
+        self.in_degree[author_id] += delta
+
+    def add(self, user_id, author_id):
+        if self._in_base(user_id, author_id):
+            removed = self._removed.get(user_id, set())
+            if author_id not in removed:
+                return
+            removed.discard(author_id)
+        else:
+            added = self._added.setdefault(user_id, set())
+            if author_id in added:
+                return
+            added.add(author_id)
+        self._bump(author_id, 1)
+
+    def remove(self, user_id, author_id):
+        if self._in_base(user_id, author_id):
+            removed = self._removed.setdefault(user_id, set())
+            if author_id in removed:
+                return
+            removed.add(author_id)
+        else:
+            added = self._added.get(user_id, set())
+            if author_id not in added:
+                return
+            added.discard(author_id)
+        self._bump(author_id, -1)
+
+    def suggestions(self, user_id, limit=10):
+        """Друзья друзей: [(автор, сколько из ваших подписок на него
+        подписаны)], при равенстве выше авторы с большим числом
+        подписчиков."""
+        following = set(self.following(user_id))
+        mutual = Counter()
+        for friend_id in following:
+            mutual.update(self.following(friend_id))
+        for seen in following | {user_id}:
+            mutual.pop(seen, None)
+        return heapq.nlargest(
+            limit, mutual.items(),
+            key=lambda item: (item[1], self.followers_count(item[0]),
+                              -item[0]),
+        )
+
+
+_graph = None
+_lock = threading.Lock()
+
+
+def _current():
+    global _graph
+    if (_graph is None
+            or time.monotonic() - _graph.built_at
+            > settings.FOLLOW_GRAPH_MAX_AGE):
+        _graph = FollowGraph.load()
+    return _graph
+
+
+def suggest(user_id, limit=10):
+    """Рекомендации по графу процесса; граф строится при первом
+    обращении и пересобирается по возрасту."""
+    # Под блокировкой: сигналы меняют оверлей из других потоков.
+    with _lock:
+        return _current().suggestions(user_id, limit)
+
+
+def reset_graph():
+    global _graph
+    with _lock:
+        _graph = None
+
+
+def graph_follow(user_id, author_id):
+    # Ещё не построенный граф и так прочитает подписку из Follow.
+    with _lock:
+        if _graph is not None:
+            _graph.add(user_id, author_id)
+
+
+def graph_unfollow(user_id, author_id):
+    with _lock:
+        if _graph is not None:
+            _graph.remove(user_id, author_id)
@@ -0,0 +1,111 @@
+"""Лента «Популярное»: рейтинг с затуханием по времени.
+
+Рейтинг поста - логарифм вовлечённости плюс бонус за свежесть::
+
+    score = ln(1 + C * комментарии + R * ln(1 + подписчики автора))
+            + ln 2 * (pub_date - HOT_EPOCH) / HALF_LIFE
+
+Порядок по такому числу совпадает с порядком по
+«вовлечённость * 2 ** (-возраст / HALF_LIFE)», но само число не зависит
+от текущего времени. Поэтому ``refresh_hot_posts`` пересчитывает только
+посты, у которых изменились комментарии или подписчики автора, и
+удаляет вышедшие из окна ``WINDOW_DAYS``, а вьюха читает таблицу
+``HotPost`` по индексу ``-score``.
+
+При шардах строки ``HotPost`` лежат на шарде своего поста и
+досчитываются по каждому шарду, а подписчиков авторов берём из
+``default`` отдельным запросом.
+"""
+import math
+from datetime import datetime, timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+
+from .cache import bump_listing_version
+from .models import HotPost, Post, UserCounters
+from .sharding import shards, sharding_enabled
+
+HOT_EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+HOT_BATCH_SIZE = 500
+
+
+def hot_score(comments_count, followers_count, pub_date, options=None):
+    options = options or settings.HOT_POSTS
+    engagement = (1 + options['COMMENT_WEIGHT'] * comments_count
+                  + options['REACH_WEIGHT'] * math.log1p(followers_count))
+    age = (pub_date - HOT_EPOCH).total_seconds() / 3600
+    return math.log(engagement) + math.log(2) * age / options[
+        'HALF_LIFE_HOURS']
+
+
+def _candidates(alias, cutoff):
+    """(id, дата, комментарии, подписчики автора) постов окна."""
+    posts = Post.objects.using(alias).filter(pub_date__gte=cutoff)
+    if not sharding_enabled():
+        return posts.values_list(
+            'pk', 'pub_date', 'comments_count',
+            'author__counters__followers_count',
+        ).iterator()
+    return _with_followers(
+        posts.values_list('pk', 'pub_date', 'comments_count', 'author_id')
+        .iterator()
+    )
+
+
+def _with_followers(rows):
+    # Счётчики авторов в default: подставляем их пачками.
+    while True:
+        batch = list(islice(rows, HOT_BATCH_SIZE))
+        if not batch:
+            return
+        followers = dict(UserCounters.objects.filter(
+            user_id__in={row[3] for row in batch}
+        ).values_list('user_id', 'followers_count'))
+        for post_id, pub_date, comments, author_id in batch:
+            yield post_id, pub_date, comments, followers.get(author_id)
+
+
+def refresh_hot_posts(now=None):
+    """Досчитывает таблицу HotPost; возвращает число созданных,
+    обновлённых и удалённых строк."""
+    options = settings.HOT_POSTS
+    cutoff = (now or timezone.now()) - timedelta(days=options['WINDOW_DAYS'])
+    totals = [0, 0, 0]
+    for alias in shards() or [DEFAULT_DB_ALIAS]:
+        for i, count in enumerate(_refresh(alias, cutoff, options)):
+            totals[i] += count
+    if any(totals):
+        bump_listing_version()
+    return tuple(totals)
+
+
+def _refresh(alias, cutoff, options):
+    stored = {
+        post_id: (comments, followers)
+        for post_id, comments, followers in HotPost.objects.using(alias)
+        .values_list('post_id', 'comments_count', 'followers_count')
+        .iterator()
+    }
+    created, updated = [], []
+    for post_id, pub_date, comments, followers in _candidates(alias, cutoff):
+        followers = followers or 0
+        inputs = stored.pop(post_id, None)
+        if inputs == (comments, followers):
+            continue
+        row = HotPost(post_id=post_id, comments_count=comments,
+                      followers_count=followers,
+                      score=hot_score(comments, followers, pub_date, options))
+        (updated if inputs else created).append(row)
+    hot = HotPost.objects.using(alias)
+    with transaction.atomic(using=alias):
+        # Всё, что осталось в stored, вышло из окна.
+        deleted, _ = hot.filter(post_id__in=stored).delete()
+        hot.bulk_create(created, batch_size=HOT_BATCH_SIZE)
+        hot.bulk_update(
+            updated, ['score', 'comments_count', 'followers_count'],
+            batch_size=HOT_BATCH_SIZE,
+        )
+    return len(created), len(updated), deleted
@@ -0,0 +1,62 @@
+"""Карта идентичности на время запроса.
+
+Вьюхи получают объекты через ``get_cached_object_or_404``: первый
+вызов идёт в БД, повторные с теми же условиями возвращают тот же
+экземпляр. Если строка всё же загружается второй раз (другим
+условием), при ``DEBUG`` это ошибка ``DuplicateFetch``.
+"""
+from django.conf import settings
+from django.db.models import QuerySet
+from django.shortcuts import get_object_or_404
+
+REQUEST_ATTR = '_identity_map'
+
+
+class DuplicateFetch(AssertionError):
+    pass
+
+
+def _as_queryset(klass):
+    if isinstance(klass, QuerySet):
+        return klass
+    if hasattr(klass, '_default_manager'):
+        return klass._default_manager.all()
+    return klass.all()
+
+
+class IdentityMap:
+    def __init__(self):
+        self._lookups = {}
+        self._objects = {}
+
+    def get(self, queryset, lookups):
+        queryset = _as_queryset(queryset)
+        model = queryset.model
+        key = (model._meta.label, tuple(sorted(lookups.items())))
+        if key in self._lookups:
+            return self._lookups[key]
+        obj = get_object_or_404(queryset, **lookups)
+        identity = (model._meta.label, obj.pk)
+        if identity in self._objects:
+            if settings.DEBUG:
+                raise DuplicateFetch(
+                    f'{identity[0]} pk={obj.pk} загружен повторно '
+                    f'по {dict(lookups)}'
+                )
+            obj = self._objects[identity]
+        self._objects[identity] = obj
+        self._lookups[key] = obj
+        return obj
+
+
+def identity_map(request):
+    imap = getattr(request, REQUEST_ATTR, None)
+    if imap is None:
+        imap = IdentityMap()
+        setattr(request, REQUEST_ATTR, imap)
+    return imap
+
+
+def get_cached_object_or_404(request, klass, **lookups):
+    """Как ``get_object_or_404``, но не чаще раза за запрос."""
+    return identity_map(request).get(klass, lookups)
@@ -0,0 +1,338 @@
+"""Потоковый импорт архивов постов, комментариев и подписок.
+
+Вход - JSONL (одна запись в строке) или CSV с заголовком. Тип записи
+задаёт поле ``type``::
+
+    {"type": "group", "slug": "cats", "title": "Коты", "description": ""}
+    {"type": "user", "username": "leo", "first_name": "Лев"}
+    {"type": "post", "id": 10, "author": "leo", "group": "cats",
+     "text": "...", "pub_date": "2021-05-01T10:00:00+03:00"}
+    {"type": "comment", "id": 7, "post": 10, "author": "leo", "text": "..."}
+    {"type": "follow", "user": "leo", "author": "tolstoy"}
+
+``id`` поста и комментария обязателен и сохраняется как первичный
+ключ, поэтому комментарии ссылаются на пост по id из архива, а
+повторный импорт того же куска ничего не дублирует. Если id уже занят
+другим постом (другой автор или текст), пост архива пропускается как
+конфликт вместе со своими комментариями. Авторы и группы, которых ещё
+нет, создаются по ходу импорта.
+
+Файл читается генераторами и пишется пачками ``bulk_create``; каждая
+пачка - отдельная транзакция, после неё в файл контрольной точки
+записывается номер последней строки.
+"""
+import csv
+import json
+import os
+from collections import Counter
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, models, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .cache import bump_listing_version
+from .counters import recount_comments, recount_users
+from .inbox import fill_inbox
+from .models import Comment, Follow, Group, Post, User
+from .search import get_engine
+from .sharding import require_unsharded
+
+IMPORT_BATCH_SIZE = 1000
+# Строк в одном UPDATE с CASE: два параметра на строку, лимит SQLite.
+DATE_UPDATE_BATCH_SIZE = 500
+RECORD_TYPES = ('group', 'user', 'post', 'comment', 'follow')
+
+
+class RecordError(ValueError):
+    """Запись архива не удаётся разобрать."""
+
+
+def read_jsonl(stream):
+    for line_no, line in enumerate(stream, 1):
+        line = line.strip()
+        if line:
+            try:
+                yield line_no, json.loads(line)
+            except ValueError as e:
+                raise RecordError(f'Строка {line_no}: {e}')
+
+
+def read_csv(stream):
+    reader = csv.DictReader(stream)
+    for line_no, row in enumerate(reader, 1):
+        yield line_no, {key: value for key, value in row.items()
+                        if value not in ('', None)}
+
+
+def read_records(stream, fmt):
+    return read_csv(stream) if fmt == 'csv' else read_jsonl(stream)
+
+
+def skip_until(records, line_no):
+    """Пропускает записи, уже импортированные до контрольной точки."""
+    for record in records:
+        if record[0] > line_no:
+            yield record
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def parse_date(value):
+    if not value:
+        return timezone.now()
+    date = parse_datetime(value)
+    if date is None:
+        raise RecordError(f'Некорректная дата: {value}')
+    if settings.USE_TZ and timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+def parse_id(record, field='id'):
+    value = record.get(field)
+    try:
+        pk = int(value)
+    except (TypeError, ValueError):
+        pk = 0
+    if pk <= 0:
+        raise RecordError(f'Запись {record.get("type")!r}: некорректное '
+                          f'поле {field}: {value!r}')
+    return pk
+
+
+def restore_pub_dates(model, dates):
+    """Возвращает даты ``{pk: pub_date}`` после ``bulk_create``.
+
+    ``auto_now_add`` ставит время вставки; отключать его у поля нельзя -
+    поле общее для всех потоков процесса.
+    """
+    items = list(dates.items())
+    for start in range(0, len(items), DATE_UPDATE_BATCH_SIZE):
+        batch = dict(items[start:start + DATE_UPDATE_BATCH_SIZE])
+        model.objects.filter(pk__in=batch).update(pub_date=models.Case(
+            *(models.When(pk=pk, then=models.Value(date))
+              for pk, date in batch.items()),
+            output_field=models.DateTimeField(),
+        ))
+
+
+class Checkpoint:
+    """Номер последней импортированной строки в JSON-файле."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        """Состояние: ``line`` и id постов-конфликтов ``conflicts``."""
+        if not self.path or not os.path.exists(self.path):
+            return {'line': 0}
+        with open(self.path) as f:
+            return json.load(f)
+
+    def save(self, line_no, conflicts=()):
+        if not self.path:
+            return
+        state = {'line': line_no}
+        if conflicts:
+            # Комментарии к ним в следующих строках тоже пропускаются.
+            state['conflicts'] = sorted(conflicts)
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class Importer:
+    """Пишет пачки записей, раскрывая имена авторов и slug групп."""
+
+    def __init__(self, batch_size=IMPORT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.users = {}
+        self.groups = {}
+        self.stats = Counter()
+        # Id постов архива, занятые в базе чужими постами.
+        self.conflicts = set()
+
+    def _resolve(self, model, field, cache, keys, defaults):
+        missing = {key for key in keys if key and key not in cache}
+        if not missing:
+            return
+        cache.update(model.objects.filter(
+            **{f'{field}__in': missing}
+        ).values_list(field, 'pk'))
+        new = [defaults(key) for key in missing if key not in cache]
+        if new:
+            model.objects.bulk_create(new, ignore_conflicts=True)
+            self.stats[f'{model._meta.model_name}_created'] += len(new)
+            cache.update(model.objects.filter(
+                **{f'{field}__in': missing}
+            ).values_list(field, 'pk'))
+
+    def resolve_users(self, names, records=()):
+        profiles = {record['username']: record for record in records}
+
+        def new_user(name):
+            profile = profiles.get(name, {})
+            return User(username=name, password=make_password(None),
+                        first_name=profile.get('first_name', ''),
+                        last_name=profile.get('last_name', ''))
+        self._resolve(User, 'username', self.users, names, new_user)
+
+    def resolve_groups(self, slugs, records=()):
+        groups = {record['slug']: record for record in records}
+
+        def new_group(slug):
+            group = groups.get(slug, {})
+            return Group(slug=slug, title=group.get('title', slug),
+                         description=group.get('description', ''))
+        self._resolve(Group, 'slug', self.groups, slugs, new_group)
+
+    def import_chunk(self, chunk):
+        by_type = {name: [] for name in RECORD_TYPES}
+        for line_no, record in chunk:
+            kind = record.get('type')
+            if kind not in by_type:
+                raise RecordError(f'Строка {line_no}: неизвестный тип '
+                                  f'{kind!r}')
+            by_type[kind].append(record)
+        self.resolve_groups(
+            {r['slug'] for r in by_type['group']}
+            | {r.get('group') for r in by_type['post']},
+            by_type['group'],
+        )
+        self.resolve_users(
+            {r['username'] for r in by_type['user']}
+            | {r['author'] for r in by_type['post']}
+            | {r['author'] for r in by_type['comment']}
+            | {r['user'] for r in by_type['follow']}
+            | {r['author'] for r in by_type['follow']},
+            by_type['user'],
+        )
+        self._import_posts(by_type['post'])
+        self._import_comments(by_type['comment'])
+        self._import_follows(by_type['follow'])
+        self.stats['rows'] += len(chunk)
+
+    def _insert_new(self, model, objects, owner):
+        """Вставляет строки, чьих id ещё нет; возвращает число вставленных.
+
+        Строка с тем же id и тем же ``owner`` и текстом - это уже
+        импортированная запись, с другими - конфликт.
+        """
+        existing = {
+            pk: rest for pk, *rest in model.objects.filter(
+                pk__in=objects).values_list('pk', owner, 'text')
+        }
+        new, conflicts = [], set()
+        for pk, obj in objects.items():
+            if pk not in existing:
+                new.append(obj)
+            elif existing[pk] != [getattr(obj, owner), obj.text]:
+                conflicts.add(pk)
+        dates = {obj.pk: obj.pub_date for obj in new}
+        model.objects.bulk_create(new, batch_size=self.batch_size,
+                                  ignore_conflicts=True)
+        restore_pub_dates(model, dates)
+        name = model._meta.model_name
+        self.stats[f'{name}s'] += len(new)
+        self.stats[f'{name}s_conflicts'] += len(conflicts)
+        return conflicts
+
+    def _import_posts(self, records):
+        posts = {}
+        for record in records:
+            pk = parse_id(record)
+            posts[pk] = Post(
+                pk=pk, text=record['text'],
+                author_id=self.users[record['author']],
+                group_id=self.groups.get(record.get('group')),
+                image=record.get('image', ''),
+                pub_date=parse_date(record.get('pub_date')),
+            )
+        self.conflicts |= self._insert_new(Post, posts, 'author_id')
+
+    def _import_comments(self, records):
+        post_ids = {parse_id(record, 'post') for record in records}
+        existing = set(Post.objects.filter(
+            pk__in=post_ids).values_list('pk', flat=True)) - self.conflicts
+        comments = {}
+        for record in records:
+            post_id = parse_id(record, 'post')
+            if post_id not in existing:
+                self.stats['comments_skipped'] += 1
+                continue
+            pk = parse_id(record)
+            comments[pk] = Comment(
+                pk=pk, post_id=post_id,
+                author_id=self.users[record['author']],
+                text=record['text'],
+                pub_date=parse_date(record.get('pub_date')),
+            )
+        self._insert_new(Comment, comments, 'post_id')
+
+    def _import_follows(self, records):
+        follows = []
+        for record in records:
+            pair = (self.users[record['user']], self.users[record['author']])
+            if pair[0] == pair[1]:
+                self.stats['follows_skipped'] += 1
+                continue
+            follows.append(Follow(user_id=pair[0], author_id=pair[1]))
+        Follow.objects.bulk_create(follows, batch_size=self.batch_size,
+                                   ignore_conflicts=True)
+        self.stats['follows'] += len(follows)
+
+    def run(self, records, checkpoint, on_chunk=None):
+        """Импортирует записи пачками, сохраняя контрольную точку."""
+        require_unsharded('Импорт')
+        state = checkpoint.load()
+        start = state['line']
+        self.conflicts.update(state.get('conflicts', ()))
+        for chunk in chunked(skip_until(records, start), self.batch_size):
+            with transaction.atomic():
+                self.import_chunk(chunk)
+            checkpoint.save(chunk[-1][0], self.conflicts)
+            if on_chunk is not None:
+                on_chunk(chunk[-1][0], self.stats)
+        return start
+
+    def finalize(self):
+        """Делает то, что при bulk_create пропустили сигналы."""
+        refresh_derived_data()
+
+
+def refresh_derived_data():
+    """Счётчики, ленты, поиск и кеш после записи в обход сигналов.
+
+    Ленты дополняются по всем подпискам из базы: новые посты нужны и
+    старым подписчикам, а пары из архива в памяти не копятся.
+    """
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(
+                no_style(), [Post, Comment]):
+            cursor.execute(sql)
+    with transaction.atomic():
+        recount_comments()
+        recount_users()
+    follows = Follow.objects.values_list('user_id', 'author_id').iterator()
+    for user_id, author_id in follows:
+        with transaction.atomic():
+            fill_inbox(user_id, author_id)
+    with transaction.atomic():
+        get_engine(require_index=False).rebuild()
+    bump_listing_version()
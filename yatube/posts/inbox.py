@@ -0,0 +1,42 @@
+"""Лента подписок, заполняемая при записи (fan-out on write).
+
+Каждый новый пост раскладывается по строкам ``Inbox`` всех подписчиков
+автора, поэтому страница ``/follow/`` читает один индекс
+``(user, -pub_date)`` вместо соединения ``Post`` с ``Follow``.
+"""
+from .models import Follow, Inbox, Post
+
+INBOX_BATCH_SIZE = 500
+
+
+def fan_out_post(post):
+    """Добавляет пост в ленты всех подписчиков автора."""
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    Inbox.objects.bulk_create(
+        (Inbox(user_id=user_id, post_id=post.pk, pub_date=post.pub_date)
+         for user_id in followers.iterator()),
+        batch_size=INBOX_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def fill_inbox(user_id, author_id):
+    """Копирует в ленту подписчика все посты автора."""
+    posts = Post.objects.filter(
+        author_id=author_id
+    ).values_list('pk', 'pub_date')
+    Inbox.objects.bulk_create(
+        (Inbox(user_id=user_id, post_id=post_id, pub_date=pub_date)
+         for post_id, pub_date in posts.iterator()),
+        batch_size=INBOX_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def clear_inbox(user_id, author_id):
+    """Убирает из ленты подписчика посты автора."""
+    Inbox.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
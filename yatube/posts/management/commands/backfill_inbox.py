@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.inbox import fill_inbox
+from posts.models import Follow, Inbox
+from posts.sharding import require_unsharded
+
+
+class Command(BaseCommand):
+    help = 'Заполняет ленты подписок (Inbox) по существующим подпискам.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Очистить ленты перед заполнением.',
+        )
+
+    def handle(self, *args, **options):
+        # При шардах лента подписок собирается без Inbox.
+        require_unsharded('Лента из Inbox')
+        if options['clear']:
+            deleted, _ = Inbox.objects.all().delete()
+            self.stdout.write(f'Удалено записей лент: {deleted}')
+        follows = Follow.objects.order_by('pk').values_list(
+            'user_id', 'author_id'
+        )
+        total = 0
+        for user_id, author_id in follows.iterator():
+            with transaction.atomic():
+                fill_inbox(user_id, author_id)
+            total += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано подписок: {total}, '
+            f'записей в лентах: {Inbox.objects.count()}'
+        ))
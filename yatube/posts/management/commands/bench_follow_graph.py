@@ -0,0 +1,75 @@
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.benchmark import summarize, timed
+from posts.graph import FollowGraph
+
+from .seed_benchmark import zipf_weights
+
+
+class Command(BaseCommand):
+    help = ('Строит граф подписок из синтетических рёбер со степенным '
+            'законом популярности и замеряет память, сборку и '
+            'рекомендации. База не используется.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200000)
+        parser.add_argument('--follows', type=int, default=10,
+                            help='Среднее число подписок на пользователя.')
+        parser.add_argument('--exponent', type=float, default=1.1)
+        parser.add_argument('--samples', type=int, default=500,
+                            help='Сколько пользователей спросить.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def edges(self, options):
+        """Уникальные пары (подписчик, автор), отсортированные по паре."""
+        rng = random.Random(options['seed'])
+        users = options['users']
+        weights = zipf_weights(users, options['exponent'])
+        population = range(1, users + 1)
+        # Пара упакована в одно число: так набор в миллионы рёбер
+        # сортируется быстро и занимает в разы меньше памяти.
+        packed = set()
+        for user_id in population:
+            wanted = int(rng.paretovariate(2) * options['follows'] / 2)
+            for author_id in rng.choices(population, cum_weights=weights,
+                                         k=min(wanted, users - 1)):
+                if author_id != user_id:
+                    packed.add(user_id * (users + 1) + author_id)
+        return [divmod(edge, users + 1) for edge in sorted(packed)]
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        edges = self.edges(options)
+        generated = time.perf_counter() - start
+
+        start = time.perf_counter()
+        graph = FollowGraph.from_pairs(edges)
+        built = time.perf_counter() - start
+        del edges
+
+        size = sum(len(part) * part.itemsize for part in
+                   (graph.offsets, graph.targets, graph.in_degree))
+        rng = random.Random(options['seed'] + 1)
+        users = [rng.randint(1, options['users'])
+                 for _ in range(options['samples'])]
+        queue = iter(users)
+        suggestions = timed(lambda: graph.suggestions(next(queue)),
+                            len(users))
+        pairs = iter([(user_id, rng.randint(1, options['users']))
+                      for user_id in users])
+        updates = timed(lambda: graph.add(*next(pairs)), len(users))
+
+        self.stdout.write(json.dumps({
+            'users': options['users'],
+            'edges': len(graph.targets),
+            'generate_seconds': round(generated, 2),
+            'build_seconds': round(built, 2),
+            'bytes': size,
+            'bytes_per_edge': round(size / max(len(graph.targets), 1), 2),
+            'suggestions': summarize(suggestions),
+            'follow_update': summarize(updates),
+        }, indent=2))
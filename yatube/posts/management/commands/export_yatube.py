@@ -0,0 +1,43 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from posts.exporter import EXPORT_BATCH_SIZE, EXPORT_TYPES, export_stream
+
+
+class Command(BaseCommand):
+    help = ('Выгружает группы, пользователей, посты, комментарии и '
+            'подписки в JSONL или CSV для import_yatube.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', '-o',
+            help='Файл для записи; по умолчанию - stdout.',
+        )
+        parser.add_argument('--format', choices=('jsonl', 'csv'),
+                            default='jsonl')
+        parser.add_argument('--gzip', action='store_true',
+                            help='Сжать вывод в gzip.')
+        parser.add_argument(
+            '--types', default=','.join(EXPORT_TYPES),
+            help='Типы записей через запятую.',
+        )
+        parser.add_argument('--batch-size', type=int,
+                            default=EXPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        chunks = export_stream(
+            fmt=options['format'],
+            compress=options['gzip'],
+            types=options['types'].split(','),
+            batch_size=options['batch_size'],
+        )
+        if options['output']:
+            with open(options['output'], 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+        else:
+            out = getattr(self.stdout, 'buffer', None) or sys.stdout.buffer
+            for chunk in chunks:
+                out.write(chunk)
+            out.flush()
@@ -0,0 +1,81 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.importer import (IMPORT_BATCH_SIZE, Checkpoint, Importer,
+                            RecordError, read_records)
+
+
+class Command(BaseCommand):
+    help = ('Импортирует посты, комментарии и подписки из JSONL или CSV '
+            'пачками bulk_create с контрольной точкой.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл архива.')
+        parser.add_argument(
+            '--format', choices=('jsonl', 'csv'),
+            help='Формат файла; по умолчанию - по расширению.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=IMPORT_BATCH_SIZE,
+            help='Записей в одной транзакции.',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл контрольной точки; по умолчанию <path>.checkpoint.',
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать с начала, игнорируя контрольную точку.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or (
+            'csv' if path.lower().endswith('.csv') else 'jsonl'
+        )
+        checkpoint = Checkpoint(options['checkpoint']
+                                or f'{path}.checkpoint')
+        if options['restart']:
+            checkpoint.clear()
+        importer = Importer(batch_size=options['batch_size'])
+        started = time.monotonic()
+
+        def report(line_no, stats):
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f'Строка {line_no}: записей {stats["rows"]}, '
+                f'{stats["rows"] / max(elapsed, 1e-6):.0f} записей/с'
+            )
+
+        if not os.path.exists(path):
+            raise CommandError(f'Файл {path} не найден')
+        with open(path, encoding='utf-8', newline='') as stream:
+            try:
+                resumed_from = importer.run(read_records(stream, fmt),
+                                            checkpoint, on_chunk=report)
+            except (RecordError, KeyError) as e:
+                raise CommandError(
+                    f'Импорт остановлен: {e!r}. Уже записанные пачки '
+                    f'сохранены, повторный запуск продолжит с '
+                    f'контрольной точки.'
+                )
+        if resumed_from:
+            self.stdout.write(f'Продолжено со строки {resumed_from}')
+        importer.finalize()
+        checkpoint.clear()
+        elapsed = time.monotonic() - started
+        stats = importer.stats
+        self.stdout.write(self.style.SUCCESS(
+            f'Импортировано за {elapsed:.1f} с: постов {stats["posts"]}, '
+            f'комментариев {stats["comments"]}, '
+            f'подписок {stats["follows"]}, '
+            f'{stats["rows"] / max(elapsed, 1e-6):.0f} записей/с'
+        ))
+        if stats['posts_conflicts'] or stats['comments_conflicts']:
+            self.stdout.write(self.style.WARNING(
+                f'Id заняты другими записями, пропущено: постов '
+                f'{stats["posts_conflicts"]}, комментариев '
+                f'{stats["comments_conflicts"]}'
+            ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.search import get_engine
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает полнотекстовый индекс постов.'
+
+    def handle(self, *args, **options):
+        engine = get_engine(require_index=False)
+        with transaction.atomic():
+            indexed = engine.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Движок: {engine.name}, постов в индексе: {indexed}'
+        ))
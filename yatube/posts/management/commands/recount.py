@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.counters import recount_comments, recount_users
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает хранимые счётчики комментариев, постов '
+            'и подписок.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            posts = recount_comments()
+        with transaction.atomic():
+            users = recount_users()
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено постов: {posts}, пользователей: {users}'
+        ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from posts.hot import refresh_hot_posts
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает ленту «Популярное»: только посты с новыми '
+            'комментариями или подписчиками. Запускайте по расписанию.')
+
+    def handle(self, *args, **options):
+        created, updated, deleted = refresh_hot_posts()
+        self.stdout.write(self.style.SUCCESS(
+            f'Добавлено: {created}, обновлено: {updated}, '
+            f'удалено: {deleted}'
+        ))
@@ -0,0 +1,188 @@
+import json
+import platform
+import subprocess
+import time
+
+import django
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.benchmark import summarize
+from posts import urls as posts_urls
+from posts.models import Follow, Group, Post, User
+
+from .seed_benchmark import BENCH_PASSWORD, USERNAME_PREFIX
+
+# Адреса, которые принимают только формы: замеряем отправку формы.
+POST_DATA = {
+    'add_comment': {'text': 'Комментарий из замера'},
+}
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ('Прогоняет все адреса posts.urls через тестовый клиент и '
+            'пишет перцентили задержки, число запросов к БД и размер '
+            'ответа в JSON. Комментарии и подписки из замера остаются '
+            'в базе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50,
+                            help='Замеров на каждый адрес.')
+        parser.add_argument('--warmup', type=int, default=3,
+                            help='Прогревочных запросов без замера.')
+        parser.add_argument('--cold', action='store_true',
+                            help='Очищать кеш перед каждым запросом.')
+        parser.add_argument('--skip', default='export',
+                            help='Имена адресов через запятую, которые '
+                                 'не замерять.')
+        parser.add_argument('--output', '-o',
+                            help='Файл для результатов; иначе stdout.')
+        parser.add_argument('--baseline',
+                            help='Прошлый результат для сравнения p50.')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.reader, self.author = self.pick_users()
+        self.post = Post.objects.filter(author=self.reader).annotate(
+            total=Count('comments')).order_by('-total').first()
+        if self.post is None:
+            raise CommandError('У пользователя нет постов: заполните '
+                               'базу командой seed_benchmark.')
+        self.group = Group.objects.annotate(
+            total=Count('posts')).order_by('-total').first()
+        clients = {'auth': Client(), 'anon': Client()}
+        clients['auth'].login(username=self.reader.username,
+                              password=BENCH_PASSWORD)
+        skip = set(filter(None, options['skip'].split(',')))
+        results = {}
+        for pattern in posts_urls.urlpatterns:
+            if pattern.name in skip:
+                continue
+            url = reverse(f'{posts_urls.app_name}:{pattern.name}',
+                          kwargs=self.url_kwargs(pattern))
+            for variant, client in clients.items():
+                key = f'{pattern.name}:{variant}'
+                results[key] = self.measure(pattern.name, url, client)
+                self.stderr.write(
+                    f'{key:32} p50={results[key]["p50_ms"]}ms '
+                    f'queries={results[key]["queries_mean"]} '
+                    f'status={results[key]["status"]}'
+                )
+        report = {'meta': self.meta(), 'results': results}
+        if options['baseline']:
+            report['comparison'] = self.compare(options['baseline'],
+                                                results)
+        data = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(data)
+        else:
+            self.stdout.write(data)
+
+    def pick_users(self):
+        users = User.objects.filter(
+            username__startswith=USERNAME_PREFIX
+        ).annotate(total=Count('posts')).order_by('-total')
+        if users.count() < 2:
+            raise CommandError('Нет данных для замера: запустите '
+                               'seed_benchmark.')
+        reader, author = users[0], users[1]
+        return reader, author
+
+    def url_kwargs(self, pattern):
+        values = {
+            'group_slug': self.group.slug if self.group else 'none',
+            'username': self.author.username,
+            'post_id': self.post.pk,
+            'pk': self.post.pk,
+        }
+        return {name: values[name]
+                for name in pattern.pattern.converters}
+
+    def prepare(self, name):
+        # Отписка без подписки даст 404: восстанавливаем её до замера.
+        if name == 'profile_unfollow':
+            Follow.objects.get_or_create(user=self.reader,
+                                         author=self.author)
+        if self.options['cold']:
+            cache.clear()
+
+    def request(self, name, url, client):
+        if name in POST_DATA:
+            return client.post(url, POST_DATA[name])
+        return client.get(url)
+
+    def measure(self, name, url, client):
+        for _ in range(self.options['warmup']):
+            self.prepare(name)
+            self.request(name, url, client)
+        samples, queries, sizes = [], [], []
+        status = None
+        for _ in range(self.options['requests']):
+            self.prepare(name)
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = self.request(name, url, client)
+                if response.streaming:
+                    body = b''.join(response.streaming_content)
+                else:
+                    body = response.content
+                samples.append(time.perf_counter() - start)
+            queries.append(len(captured))
+            sizes.append(len(body))
+            status = response.status_code
+        result = summarize(samples)
+        result.update({
+            'url': url,
+            'status': status,
+            'queries_mean': round(sum(queries) / len(queries), 2),
+            'queries_max': max(queries),
+            'bytes_mean': round(sum(sizes) / len(sizes)),
+        })
+        return result
+
+    def meta(self):
+        return {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'requests': self.options['requests'],
+            'cold_cache': self.options['cold'],
+            'rows': {
+                'users': User.objects.count(),
+                'posts': Post.objects.count(),
+                'follows': Follow.objects.count(),
+            },
+        }
+
+    def compare(self, path, results):
+        with open(path, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        comparison = {}
+        for key, result in results.items():
+            before = baseline.get(key)
+            if not before or not before['p50_ms']:
+                continue
+            comparison[key] = {
+                'p50_ratio': round(result['p50_ms'] / before['p50_ms'], 3),
+                'queries_delta': round(
+                    result['queries_mean'] - before['queries_mean'], 2),
+            }
+        return comparison
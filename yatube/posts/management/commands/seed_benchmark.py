@@ -0,0 +1,195 @@
+import random
+from datetime import timedelta
+from io import BytesIO
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from faker import Faker
+from PIL import Image
+
+from posts.importer import refresh_derived_data, restore_pub_dates
+from posts.models import Comment, Follow, Group, Post, User
+from posts.thumbnails import generate_thumbnails
+
+USERNAME_PREFIX = 'bench_'
+BENCH_PASSWORD = 'bench-password'
+SEED_BATCH_SIZE = 1000
+
+
+def zipf_weights(count, exponent):
+    """Накопленные веса степенного закона: первый элемент самый частый."""
+    return list(accumulate(1 / (rank ** exponent)
+                           for rank in range(1, count + 1)))
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими пользователями, группами, '
+            'постами, комментариями и подписками для замеров.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--groups', type=int, default=10)
+        parser.add_argument('--posts', type=int, default=2000)
+        parser.add_argument('--comments', type=int, default=5000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Среднее число подписок на пользователя.',
+        )
+        parser.add_argument(
+            '--exponent', type=float, default=1.1,
+            help='Показатель степенного закона популярности авторов.',
+        )
+        parser.add_argument(
+            '--image-ratio', type=float, default=0.1,
+            help='Доля постов с картинкой.',
+        )
+        parser.add_argument('--images', type=int, default=5,
+                            help='Сколько разных картинок создать.')
+        parser.add_argument('--days', type=int, default=365,
+                            help='За сколько дней разбросать даты.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--clear', action='store_true',
+            help=f'Удалить пользователей {USERNAME_PREFIX}* и их данные.',
+        )
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(options['seed'])
+        self.now = timezone.now()
+        self.days = options['days']
+        if options['clear']:
+            deleted, _ = User.objects.filter(
+                username__startswith=USERNAME_PREFIX).delete()
+            self.stdout.write(f'Удалено объектов: {deleted}')
+        users = self.create_users(options['users'])
+        groups = self.create_groups(options['groups'])
+        images = self.create_images(options['images'])
+        posts = self.create_posts(users, groups, images, options)
+        self.create_comments(users, posts, options['comments'],
+                             options['exponent'])
+        self.create_follows(users, options['follows'], options['exponent'])
+        refresh_derived_data()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пользователей: {len(users)}, групп: {len(groups)}, '
+            f'постов: {len(posts)}; пароль: {BENCH_PASSWORD}'
+        ))
+
+    def random_date(self):
+        return self.now - timedelta(
+            seconds=self.rng.randrange(max(self.days, 1) * 86400))
+
+    def bulk_create(self, model, objects):
+        with transaction.atomic():
+            model.objects.bulk_create(objects, batch_size=SEED_BATCH_SIZE,
+                                      ignore_conflicts=True)
+
+    def bulk_create_dated(self, model, objects):
+        """bulk_create с датами объектов вместо времени вставки."""
+        # SQLite не возвращает id из bulk_create: задаём их сами, чтобы
+        # потом вернуть даты одним UPDATE.
+        start = (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+        for pk, obj in enumerate(objects, start):
+            obj.pk = pk
+        dates = {obj.pk: obj.pub_date for obj in objects}
+        with transaction.atomic():
+            model.objects.bulk_create(objects, batch_size=SEED_BATCH_SIZE)
+            restore_pub_dates(model, dates)
+
+    def create_users(self, count):
+        start = User.objects.filter(
+            username__startswith=USERNAME_PREFIX).count()
+        password = make_password(BENCH_PASSWORD)
+        self.bulk_create(User, [
+            User(username=f'{USERNAME_PREFIX}{start + i}', password=password,
+                 first_name=self.fake.first_name(),
+                 last_name=self.fake.last_name())
+            for i in range(count)
+        ])
+        # Порядок важен: первые пользователи станут самыми популярными.
+        return list(User.objects.filter(
+            username__startswith=USERNAME_PREFIX
+        ).order_by('pk').values_list('pk', flat=True))
+
+    def create_groups(self, count):
+        start = Group.objects.filter(slug__startswith='bench-').count()
+        self.bulk_create(Group, [
+            Group(slug=f'bench-{start + i}',
+                  title=self.fake.sentence(nb_words=3)[:200],
+                  description=self.fake.paragraph())
+            for i in range(count)
+        ])
+        return list(Group.objects.filter(
+            slug__startswith='bench-').values_list('pk', flat=True))
+
+    def create_images(self, count):
+        names = []
+        for i in range(count):
+            color = tuple(self.rng.randrange(256) for _ in range(3))
+            buffer = BytesIO()
+            Image.new('RGB', (1920, 1080), color).save(buffer, 'JPEG')
+            name = default_storage.save(f'posts/bench_{i}.jpg',
+                                        ContentFile(buffer.getvalue()))
+            generate_thumbnails(name)
+            names.append(name)
+        return names
+
+    def create_posts(self, users, groups, images, options):
+        weights = zipf_weights(len(users), options['exponent'])
+        authors = self.rng.choices(users, cum_weights=weights,
+                                   k=options['posts'])
+        posts = []
+        for author_id in authors:
+            image = ''
+            if images and self.rng.random() < options['image_ratio']:
+                image = self.rng.choice(images)
+            posts.append(Post(
+                author_id=author_id,
+                group_id=(self.rng.choice(groups)
+                          if groups and self.rng.random() < 0.7 else None),
+                text=self.fake.text(max_nb_chars=600),
+                image=image,
+                pub_date=self.random_date(),
+            ))
+        self.bulk_create_dated(Post, posts)
+        return list(Post.objects.filter(
+            author_id__in=users).order_by('-pub_date').values_list(
+                'pk', 'pub_date'))
+
+    def create_comments(self, users, posts, count, exponent):
+        if not posts:
+            return
+        # Свежие посты комментируют чаще.
+        weights = zipf_weights(len(posts), exponent)
+        targets = self.rng.choices(posts, cum_weights=weights, k=count)
+        self.bulk_create_dated(Comment, [
+            Comment(post_id=post_id, author_id=self.rng.choice(users),
+                    text=self.fake.sentence(nb_words=12),
+                    pub_date=pub_date + (self.now - pub_date)
+                    * self.rng.random())
+            for post_id, pub_date in targets
+        ])
+
+    def create_follows(self, users, average, exponent):
+        if len(users) < 2:
+            return
+        weights = zipf_weights(len(users), exponent)
+        follows = []
+        for user_id in users:
+            # Число подписок тоже с тяжёлым хвостом: Парето со средним
+            # примерно average.
+            wanted = min(len(users) - 1,
+                         int(self.rng.paretovariate(2) * average / 2))
+            authors = set(self.rng.choices(users, cum_weights=weights,
+                                           k=wanted))
+            authors.discard(user_id)
+            follows += [Follow(user_id=user_id, author_id=author_id)
+                        for author_id in authors]
+        self.bulk_create(Follow, follows)
@@ -0,0 +1,72 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:24
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def count_subquery(model, field, outer='pk'):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef(outer)})
+        .order_by().values(field)
+        .annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def recount(apps, schema_editor):
+    # Исторические модели вместо posts.counters: миграция не должна
+    # зависеть от текущего кода приложения.
+    connection = schema_editor.connection
+    if connection.settings_dict.get('SHARD'):
+        # Пользователи и подписки - в default, на шарде считать нечего.
+        return
+    alias = connection.alias
+    User = apps.get_model('auth', 'User')
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    UserCounters = apps.get_model('posts', 'UserCounters')
+    Post.objects.using(alias).update(
+        comments_count=count_subquery(Comment, 'post'))
+    UserCounters.objects.using(alias).bulk_create(
+        [UserCounters(user_id=pk)
+         for pk in User.objects.using(alias).values_list('pk', flat=True)],
+        batch_size=1000,
+    )
+    UserCounters.objects.using(alias).update(
+        posts_count=count_subquery(Post, 'author', 'user_id'),
+        followers_count=count_subquery(Follow, 'author', 'user_id'),
+        following_count=count_subquery(Follow, 'user', 'user_id'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0002_inbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserCounters',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counters', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Постов')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='Подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='Подписок')),
+            ],
+            options={
+                'verbose_name': 'Счётчики пользователя',
+                'verbose_name_plural': 'Счётчики пользователей',
+            },
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество комментариев'),
+        ),
+        migrations.RunPython(recount, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+from django.db import migrations
+
+# Схема индекса на момент миграции; код posts.search может меняться.
+FTS_TABLE = 'posts_post_fts'
+
+
+def fts5_available(connection):
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    # Индекс всех постов лежит в default, на шардах он не нужен. Без
+    # FTS5 поиск работает через LIKE; индекс потом соберёт
+    # manage.py rebuild_search_index.
+    if connection.settings_dict.get('SHARD') or not fts5_available(
+            connection):
+        return
+    post_table = apps.get_model('posts', 'Post')._meta.db_table
+    group_table = apps.get_model('posts', 'Group')._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING '
+            f"fts5(text, group_title, group_id UNINDEXED, "
+            f"tokenize='unicode61 remove_diacritics 2')"
+        )
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, text, group_title, group_id) '
+            f"SELECT p.id, p.text, COALESCE(g.title, ''), p.group_id "
+            f'FROM {post_table} p '
+            f'LEFT JOIN {group_table} g ON g.id = p.group_id'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
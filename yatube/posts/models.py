@@ -2,6 +2,8 @@ from django.db import models
 from django.contrib.auth import get_user_model
 from core.models import CreatedModel
 
+from .sharding import ShardedQuerySetMixin, sharding_enabled
+
 
 User = get_user_model()
 POST_STR_MULTIPLIER = 15        # Ограничение текста в 15 символов.
@@ -20,6 +22,28 @@ class Group(models.Model):
         verbose_name_plural = 'Группы'
 
 
+class PostQuerySet(ShardedQuerySetMixin, models.QuerySet):
+    shard_key = 'author_id'
+
+    # Поля, которые нужны карточке поста в списках.
+    LISTING_FIELDS = (
+        'id', 'text', 'pub_date', 'image', 'comments_count',
+        'author__id', 'author__username', 'author__first_name',
+        'author__last_name',
+        'group__id', 'group__title', 'group__slug',
+    )
+
+    def for_listing(self):
+        """Посты для списков: автор и группа одним JOIN, без лишних
+        колонок; число комментариев берётся из хранимого счётчика."""
+        fields = self.LISTING_FIELDS
+        if sharding_enabled():
+            # Без JOIN only() принимает только поля самого поста.
+            fields = [name for name in fields if '__' not in name]
+            fields += ['author', 'group']
+        return self.with_related('author', 'group').only(*fields)
+
+
 class Post(CreatedModel):
     text = models.TextField('Текст поста',
                             help_text='Введите текст поста')
@@ -37,6 +61,13 @@ class Post(CreatedModel):
         upload_to='posts/',
         blank=True
     )
+    comments_count = models.PositiveIntegerField(
+        'Количество комментариев',
+        default=0,
+        editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
 
     def __str__(self):
         return self.text[:POST_STR_MULTIPLIER]
@@ -45,6 +76,19 @@ class Post(CreatedModel):
         verbose_name = 'Постики'
         verbose_name_plural = 'Постики'
         ordering = ['-pub_date']
+        # id в конце - для порядка курсорной пагинации (-pub_date, -pk).
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_pub_date_id_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_pub_date_id_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_pub_date_id_idx'),
+        ]
+
+
+class CommentQuerySet(ShardedQuerySetMixin, models.QuerySet):
+    shard_key = 'post_id'
 
 
 class Comment(CreatedModel):
@@ -56,6 +100,15 @@ class Comment(CreatedModel):
                                verbose_name='Автор')
     text = models.TextField('Комментарий')
 
+    objects = CommentQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['pub_date']
+        indexes = [
+            models.Index(fields=['post', 'pub_date'],
+                         name='comment_post_pub_date_idx'),
+        ]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE,
@@ -67,6 +120,83 @@ class Follow(models.Model):
     class Meta:
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'author'],
+                                    name='unique_follow'),
+        ]
 
     def __str__(self):
         return f'Подписка {self.user} на {self.author}'
+
+
+class UserCounters(models.Model):
+    """Хранимые счётчики пользователя, чтобы не считать COUNT(*)."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE,
+                                primary_key=True,
+                                related_name='counters',
+                                verbose_name='Пользователь')
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+    def __str__(self):
+        return f'Счётчики {self.user}'
+
+
+class Inbox(models.Model):
+    """Лента подписок: копия поста для каждого подписчика автора."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='inbox',
+                             verbose_name='Подписчик')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name='inbox_entries',
+                             verbose_name='Пост')
+    pub_date = models.DateTimeField('Дата создания поста')
+
+    class Meta:
+        verbose_name = 'Лента подписок'
+        verbose_name_plural = 'Ленты подписок'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='unique_inbox_post'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date'],
+                         name='inbox_user_pub_date_idx'),
+        ]
+
+    def __str__(self):
+        return f'Пост {self.post_id} в ленте {self.user}'
+
+
+class HotPost(models.Model):
+    """Лента «Популярное», которую досчитывает refresh_hot_posts."""
+    post = models.OneToOneField(Post, on_delete=models.CASCADE,
+                                primary_key=True, related_name='hot',
+                                verbose_name='Пост')
+    score = models.FloatField('Рейтинг')
+    # Входные данные последнего расчёта: по ним видно, что менять.
+    comments_count = models.PositiveIntegerField('Комментариев')
+    followers_count = models.PositiveIntegerField('Подписчиков автора')
+
+    class Meta:
+        verbose_name = 'Популярный пост'
+        verbose_name_plural = 'Популярные посты'
+        indexes = [
+            models.Index(fields=['-score'], name='hot_post_score_idx'),
+        ]
+
+    def __str__(self):
+        return f'Пост {self.post_id}: {self.score:.3f}'
+
+
+class ShardTicket(models.Model):
+    """Счётчик первичных ключей постов и комментариев на шардах."""
+
+    class Meta:
+        verbose_name = 'Номер для шарда'
+        verbose_name_plural = 'Номера для шардов'
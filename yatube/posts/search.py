@@ -0,0 +1,306 @@
+"""Полнотекстовый поиск по постам.
+
+На SQLite с FTS5 текст поста и название его группы лежат в
+виртуальной таблице ``posts_post_fts`` (rowid = id поста), которую
+синхронизируют сигналы, а результаты сортируются по bm25. На других
+базах работает запасной движок на ``LIKE``.
+
+Выбор движка - ``settings.POST_SEARCH_ENGINE``: ``'auto'``, ``'fts5'``
+или ``'like'``. ``'auto'`` берёт FTS5, только если таблица индекса уже
+есть: если FTS5 появился после миграции, до
+``manage.py rebuild_search_index`` работает ``LIKE``.
+
+При шардах индекс всех постов лежит в ``default`` (rowid - глобальный
+id поста), найденные посты читаются с их шардов, а ``LIKE`` ищет по
+всем шардам через ``ShardedListing``.
+"""
+import re
+import sqlite3
+from collections import defaultdict
+from functools import lru_cache
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Group, Post
+from .sharding import ShardedListing, shard_for_pk, shards, sharding_enabled
+
+FTS_TABLE = 'posts_post_fts'
+FTS_BATCH_SIZE = 1000
+# Вес совпадения в тексте и в названии группы для bm25.
+TEXT_WEIGHT = 1.0
+GROUP_WEIGHT = 0.5
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+@lru_cache(maxsize=None)
+def _sqlite_has_fts5():
+    # Библиотека SQLite одна на процесс, проверяем её один раз.
+    probe = sqlite3.connect(':memory:')
+    try:
+        row = probe.execute(
+            "SELECT sqlite_compileoption_used('ENABLE_FTS5')"
+        ).fetchone()
+    finally:
+        probe.close()
+    return bool(row[0])
+
+
+def fts5_available(conn=connection):
+    return conn.vendor == 'sqlite' and _sqlite_has_fts5()
+
+
+_indexed = set()
+
+
+def fts_index_exists(conn=connection):
+    # Найденную таблицу помним: проверка нужна на каждое сохранение поста.
+    if conn.alias not in _indexed:
+        if FTS_TABLE not in conn.introspection.table_names():
+            return False
+        _indexed.add(conn.alias)
+    return True
+
+
+def match_expression(query):
+    """Превращает ввод пользователя в безопасный запрос MATCH.
+
+    Каждое слово берётся в кавычки, поэтому операторы FTS5 во вводе
+    не работают; последнее слово ищется по префиксу.
+    """
+    words = WORD_RE.findall(query)
+    if not words:
+        return ''
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+class SearchResults:
+    """Ленивая выборка по FTS5: ``count()`` и срезы для Paginator."""
+
+    def __init__(self, match, queryset):
+        self.match = match
+        self.queryset = queryset
+        self.model = queryset.model
+        self._count = None
+
+    def _where(self):
+        """Совпадение в индексе и пост из ``queryset``: счёт и срезы
+        видят одни и те же строки."""
+        if sharding_enabled():
+            # Подзапрос к постам в default невозможен: фильтр queryset
+            # применяется при чтении постов с шардов.
+            return f'{FTS_TABLE} MATCH %s', [self.match]
+        sql, params = self.queryset.order_by().values(
+            'pk').query.sql_with_params()
+        return (f'{FTS_TABLE} MATCH %s AND rowid IN ({sql})',
+                [self.match, *params])
+
+    def count(self):
+        if self._count is None:
+            where, params = self._where()
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'SELECT COUNT(*) FROM {FTS_TABLE} WHERE {where}',
+                    params,
+                )
+                self._count = cursor.fetchone()[0]
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start = index.start or 0
+        limit = -1 if index.stop is None else max(index.stop - start, 0)
+        where, params = self._where()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {where} '
+                f'ORDER BY bm25({FTS_TABLE}, %s, %s), rowid DESC '
+                f'LIMIT %s OFFSET %s',
+                [*params, TEXT_WEIGHT, GROUP_WEIGHT, limit, start],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        posts = self._load(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+    def _load(self, ids):
+        if not sharding_enabled():
+            return self.queryset.in_bulk(ids)
+        by_shard = defaultdict(list)
+        for pk in ids:
+            by_shard[shard_for_pk(pk)].append(pk)
+        posts = {}
+        for alias, pks in by_shard.items():
+            posts.update(self.queryset.using(alias).in_bulk(pks))
+        return posts
+
+
+class Fts5Engine:
+    name = 'fts5'
+
+    def search(self, query, queryset=None):
+        """Посты по запросу, отсортированные по релевантности."""
+        if queryset is None:
+            queryset = Post.objects.select_related('author', 'group')
+        match = match_expression(query)
+        if not match:
+            return queryset.none()
+        return SearchResults(match, queryset)
+
+    def filter(self, queryset, query):
+        """Фильтр без ранжирования, например для админки."""
+        match = match_expression(query)
+        if not match:
+            return queryset.none()
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            [match],
+        ))
+
+    def create_index(self, conn=connection):
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING '
+                f"fts5(text, group_title, group_id UNINDEXED, "
+                f"tokenize='unicode61 remove_diacritics 2')"
+            )
+
+    def drop_index(self, conn=connection):
+        with conn.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+        _indexed.discard(conn.alias)
+
+    def rebuild(self, conn=connection, post_table='posts_post',
+                group_table='posts_group'):
+        """Заполняет индекс заново, возвращает число постов в нём."""
+        self.create_index(conn)
+        with conn.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            if sharding_enabled():
+                self._fill_from_shards(cursor)
+            else:
+                cursor.execute(
+                    f'INSERT INTO {FTS_TABLE} '
+                    f'(rowid, text, group_title, group_id) '
+                    f"SELECT p.id, p.text, COALESCE(g.title, ''), "
+                    f'p.group_id FROM {post_table} p '
+                    f'LEFT JOIN {group_table} g ON g.id = p.group_id'
+                )
+            cursor.execute(f'SELECT COUNT(*) FROM {FTS_TABLE}')
+            return cursor.fetchone()[0]
+
+    def _fill_from_shards(self, cursor):
+        # Посты на шардах, группы в default: JOIN между ними нет.
+        titles = dict(Group.objects.values_list('pk', 'title'))
+        for alias in shards():
+            rows = Post.objects.using(alias).values_list(
+                'pk', 'text', 'group_id').iterator()
+            while True:
+                batch = list(islice(rows, FTS_BATCH_SIZE))
+                if not batch:
+                    break
+                cursor.executemany(
+                    f'INSERT INTO {FTS_TABLE} '
+                    f'(rowid, text, group_title, group_id) '
+                    f'VALUES (%s, %s, %s, %s)',
+                    [(pk, text, titles.get(group_id, ''), group_id)
+                     for pk, text, group_id in batch],
+                )
+
+    def index_post(self, post):
+        group_title = post.group.title if post.group_id else ''
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                           [post.pk])
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} '
+                f'(rowid, text, group_title, group_id) '
+                f'VALUES (%s, %s, %s, %s)',
+                [post.pk, post.text, group_title, post.group_id],
+            )
+
+    def unindex_post(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                           [post_id])
+
+    def update_group(self, group, deleted=False):
+        with connection.cursor() as cursor:
+            if deleted:
+                cursor.execute(
+                    f"UPDATE {FTS_TABLE} SET group_title = '', "
+                    f'group_id = NULL WHERE group_id = %s',
+                    [group.pk],
+                )
+            else:
+                cursor.execute(
+                    f'UPDATE {FTS_TABLE} SET group_title = %s '
+                    f'WHERE group_id = %s',
+                    [group.title, group.pk],
+                )
+
+
+class LikeEngine:
+    """Запасной движок: ``LIKE`` по тексту и названию группы."""
+    name = 'like'
+
+    def search(self, query, queryset=None):
+        if queryset is None:
+            queryset = Post.objects.select_related('author', 'group')
+        results = self.filter(queryset, query)
+        if sharding_enabled():
+            return ShardedListing(results)
+        return results
+
+    def filter(self, queryset, query):
+        words = WORD_RE.findall(query)
+        if not words:
+            return queryset.none()
+        for word in words:
+            queryset = queryset.filter(
+                Q(text__icontains=word) | self._group_match(word)
+            )
+        return queryset
+
+    def _group_match(self, word):
+        if sharding_enabled():
+            # Группы в default, посты на шардах: сначала id групп.
+            return Q(group_id__in=list(Group.objects.filter(
+                title__icontains=word).values_list('pk', flat=True)))
+        return Q(group__title__icontains=word)
+
+    def create_index(self, conn=connection):
+        pass
+
+    def drop_index(self, conn=connection):
+        pass
+
+    def rebuild(self, conn=connection, **kwargs):
+        return 0
+
+    def index_post(self, post):
+        pass
+
+    def unindex_post(self, post_id):
+        pass
+
+    def update_group(self, group, deleted=False):
+        pass
+
+
+def get_engine(conn=connection, require_index=True):
+    """Движок поиска; ``require_index=False`` - для сборки индекса,
+    когда таблицы может ещё не быть."""
+    name = getattr(settings, 'POST_SEARCH_ENGINE', 'auto')
+    if name == 'auto':
+        name = 'fts5' if fts5_available(conn) and (
+            not require_index or fts_index_exists(conn)) else 'like'
+    return Fts5Engine() if name == 'fts5' else LikeEngine()
@@ -0,0 +1,218 @@
+"""Необязательное шардирование постов и комментариев по автору.
+
+Включается списком ``settings.DATABASE_SHARDS``; пустой список - всё
+в ``default``, как раньше. Пост хранится на шарде своего автора
+(``shard_for_author``), комментарий - на шарде своего поста, чтобы
+``post.comments`` оставался запросом к одной базе. Пользователи,
+группы, подписки, счётчики и поисковый индекс остаются в ``default``,
+поэтому авторы и группы подгружаются через ``prefetch_related``, а не
+JOIN.
+
+Первичные ключи выдаёт таблица ``ShardTicket`` в ``default``, а номер
+шарда хранится в младших ``SHARD_BITS`` битах ключа: ``shard_for_pk``
+находит пост по id без обращения к другим базам.
+
+``QuerySet.create()`` и ``get_or_create()`` выбирают базу до появления
+строки, поэтому ``ShardedQuerySetMixin`` сам отправляет их на шард
+автора или поста. ``bulk_create()`` шард не выбирает и без ``using()``
+при включённых шардах отказывается работать.
+
+Списки по всем авторам (главная, группа, лента подписок) собирает
+``ShardedListing``: каждый шард отдаёт первые ``offset + limit`` строк
+в нужном порядке, а ``heapq.merge`` сливает их.
+
+Поиск, пересчёт счётчиков и «Популярное» обходят все шарды. Импорт,
+экспорт и лента из ``Inbox`` пока умеют только ``default`` и при
+включённых шардах падают с ``NotSupportedError`` (``require_unsharded``).
+"""
+import heapq
+from itertools import islice
+from operator import attrgetter
+
+from django.conf import settings
+from django.db import NotSupportedError
+
+SHARD_BITS = 6
+SHARDED_MODELS = {'posts.Post', 'posts.Comment'}
+
+
+def shards():
+    return getattr(settings, 'DATABASE_SHARDS', [])
+
+
+def sharding_enabled():
+    return bool(shards())
+
+
+def require_unsharded(feature):
+    """Отказ для кода, который пока работает только с ``default``."""
+    if sharding_enabled():
+        raise NotSupportedError(
+            f'{feature} не поддерживает DATABASE_SHARDS')
+
+
+def shard_for_author(author_id):
+    aliases = shards()
+    return aliases[author_id % len(aliases)]
+
+
+def shard_for_pk(pk):
+    return shards()[pk & ((1 << SHARD_BITS) - 1)]
+
+
+def make_pk(ticket, alias):
+    return (ticket << SHARD_BITS) | shards().index(alias)
+
+
+def db_for_post(post_id):
+    """База поста для ``QuerySet.using()``; ``None`` - решает роутер."""
+    return shard_for_pk(int(post_id)) if sharding_enabled() else None
+
+
+def allocate_pk(alias):
+    """Новый первичный ключ для строки на шарде ``alias``."""
+    from .models import ShardTicket
+    ticket = ShardTicket.objects.using('default').create().pk
+    # AUTOINCREMENT не выдаёт номер повторно, строка больше не нужна.
+    ShardTicket.objects.using('default').filter(pk=ticket).delete()
+    return make_pk(ticket, alias)
+
+
+def instance_shard(model, instance):
+    """Шард строки ``model``, к которой относится ``instance``."""
+    label = instance._meta.label
+    if label == settings.AUTH_USER_MODEL:
+        # author.posts; комментарии автора разбросаны по шардам постов.
+        if model._meta.label == 'posts.Post':
+            return shard_for_author(instance.pk)
+        return None
+    if label == 'posts.Post':
+        if instance.pk is not None:
+            return shard_for_pk(instance.pk)
+        return shard_for_author(instance.author_id)
+    if label == 'posts.Comment':
+        return shard_for_pk(instance.post_id)
+    return None
+
+
+class ShardRouter:
+    """Запросы к постам и комментариям - на шард по подсказке instance.
+
+    Без подсказки (``Post.objects.filter(...)``) решает следующий
+    роутер: такие запросы шард выбирают явно через ``using()``.
+    """
+
+    def _route(self, model, **hints):
+        instance = hints.get('instance')
+        if (model._meta.label not in SHARDED_MODELS or instance is None
+                or not sharding_enabled()):
+            return None
+        return instance_shard(model, instance)
+
+    db_for_read = _route
+    db_for_write = _route
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if sharding_enabled() and SHARDED_MODELS & {obj1._meta.label,
+                                                    obj2._meta.label}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # На шардах нужны только таблицы постов.
+        if settings.DATABASES.get(db, {}).get('SHARD'):
+            return app_label == 'posts'
+        return None
+
+
+class ShardedQuerySetMixin:
+    """Создание строк на шарде, который определяет ``shard_key``, и
+    связанные объекты без JOIN между базами."""
+    shard_key = None
+
+    def _shard_for(self, fields):
+        obj = self.model(**{name: value for name, value in fields.items()
+                            if '__' not in name})
+        if getattr(obj, self.shard_key) is None:
+            raise ValueError(f'Шард {self.model._meta.label} выбирается '
+                             f'по {self.shard_key}, а он не задан')
+        return instance_shard(self.model, obj)
+
+    def with_related(self, *fields):
+        """``select_related``, а при шардах ``prefetch_related``:
+        пользователи и группы лежат в другой базе."""
+        if sharding_enabled():
+            return self.prefetch_related(*fields)
+        return self.select_related(*fields)
+
+    def create(self, **kwargs):
+        if self._db is not None or not sharding_enabled():
+            return super().create(**kwargs)
+        return self.using(self._shard_for(kwargs)).create(**kwargs)
+
+    def get_or_create(self, defaults=None, **kwargs):
+        if self._db is not None or not sharding_enabled():
+            return super().get_or_create(defaults, **kwargs)
+        alias = self._shard_for({**kwargs, **(defaults or {})})
+        return self.using(alias).get_or_create(defaults, **kwargs)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        if self._db is None and sharding_enabled():
+            raise NotSupportedError(
+                f'bulk_create() не выбирает шард для '
+                f'{self.model._meta.label}: используйте create() или '
+                f'using() с ключами из allocate_pk()')
+        return super().bulk_create(objs, *args, **kwargs)
+
+
+def listing_key(ordering):
+    """Ключ и направление слияния для ``ordering`` в одну сторону."""
+    directions = {name.startswith('-') for name in ordering}
+    if len(directions) != 1:
+        raise ValueError('Слияние шардов поддерживает только порядок '
+                         'в одну сторону')
+    return attrgetter(*(name.lstrip('-') for name in ordering)), \
+        directions.pop()
+
+
+class ShardedListing:
+    """Список со всех шардов для Paginator и CursorPaginator.
+
+    Поддерживает ``count()``, срезы, ``filter()`` и ``order_by()``.
+    """
+
+    def __init__(self, queryset, aliases=None,
+                 ordering=('-pub_date', '-pk')):
+        self.queryset = queryset
+        self.model = queryset.model
+        self.aliases = shards() if aliases is None else aliases
+        self.ordering = tuple(ordering)
+
+    def _clone(self, queryset, ordering=None):
+        return ShardedListing(queryset, self.aliases,
+                              ordering or self.ordering)
+
+    def filter(self, *args, **kwargs):
+        return self._clone(self.queryset.filter(*args, **kwargs))
+
+    def order_by(self, *ordering):
+        return self._clone(self.queryset.order_by(*ordering), ordering)
+
+    def count(self):
+        return sum(self.queryset.using(alias).count()
+                   for alias in self.aliases)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        if stop is None:
+            raise ValueError('Нужна верхняя граница среза')
+        queryset = self.queryset.order_by(*self.ordering)
+        parts = [queryset.using(alias)[:stop] for alias in self.aliases]
+        key, reverse = listing_key(self.ordering)
+        return list(islice(heapq.merge(*parts, key=key, reverse=reverse),
+                           start, stop))
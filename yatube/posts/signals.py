@@ -0,0 +1,105 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .cache import bump_listing_version, bump_user_version
+from .cards import forget_cards, forget_cards_where
+from .counters import bump_post_comments, bump_user, create_user_counters
+from .graph import graph_follow, graph_unfollow
+from .inbox import clear_inbox, fan_out_post, fill_inbox
+from .models import Comment, Follow, Group, Post, User
+from .search import get_engine
+from .sharding import allocate_pk, instance_shard, sharding_enabled
+
+
+@receiver(post_save, sender=User)
+def user_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        create_user_counters(instance.pk)
+
+
+# Поля пользователя, которые выводит карточка поста.
+CARD_USER_FIELDS = {'username', 'first_name', 'last_name'}
+
+
+@receiver(post_save, sender=User)
+def author_saved(sender, instance, created, raw=False, update_fields=None,
+                 **kwargs):
+    # Вход сохраняет только last_login: карточки не трогаем.
+    if created or raw or (update_fields is not None
+                          and not CARD_USER_FIELDS & set(update_fields)):
+        return
+    forget_cards_where(author_id=instance.pk)
+    # Фрагменты списков держат готовый HTML карточек.
+    bump_listing_version()
+
+
+@receiver(pre_save, sender=Post)
+@receiver(pre_save, sender=Comment)
+def assign_shard_pk(sender, instance, raw=False, **kwargs):
+    # Ключ на шардах выдаёт default: в нём зашит номер шарда.
+    if instance.pk is None and not raw and sharding_enabled():
+        instance.pk = allocate_pk(instance_shard(sender, instance))
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        bump_user(instance.author_id, posts_count=1)
+        if not sharding_enabled():
+            fan_out_post(instance)
+    get_engine().index_post(instance)
+    forget_cards([instance.pk])
+    bump_listing_version()
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    bump_user(instance.author_id, posts_count=-1)
+    get_engine().unindex_post(instance.pk)
+    forget_cards([instance.pk])
+    bump_listing_version()
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, **kwargs):
+    get_engine().update_group(instance)
+    forget_cards_where(group=instance)
+    bump_listing_version()
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    get_engine().update_group(instance, deleted=True)
+    bump_listing_version()
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        bump_post_comments(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    bump_post_comments(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        bump_user(instance.user_id, following_count=1)
+        bump_user(instance.author_id, followers_count=1)
+        if not sharding_enabled():
+            fill_inbox(instance.user_id, instance.author_id)
+        graph_follow(instance.user_id, instance.author_id)
+        bump_user_version(instance.user_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    bump_user(instance.user_id, following_count=-1)
+    bump_user(instance.author_id, followers_count=-1)
+    if not sharding_enabled():
+        clear_inbox(instance.user_id, instance.author_id)
+    graph_unfollow(instance.user_id, instance.author_id)
+    bump_user_version(instance.user_id)
@@ -0,0 +1,42 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+
+from posts.cache import listing_fragment_key
+
+register = template.Library()
+
+
+class ListingCacheNode(template.Node):
+    def __init__(self, nodelist, personal):
+        self.nodelist = nodelist
+        self.personal = personal
+
+    def render(self, context):
+        key = listing_fragment_key(context['request'], self.personal)
+        value = cache.get(key)
+        if value is None:
+            value = self.nodelist.render(context)
+            cache.set(key, value, settings.LISTING_CACHE_TIMEOUT)
+        return value
+
+
+@register.tag
+def listing_cache(parser, token):
+    """Кеширует список постов до следующего изменения постов или групп.
+
+    Использование::
+
+        {% listing_cache %} ... {% endlisting_cache %}
+        {% listing_cache personal %} ... {% endlisting_cache %}
+
+    ``personal`` добавляет в ключ пользователя и версию его подписок.
+    """
+    bits = token.split_contents()
+    if len(bits) > 2 or (len(bits) == 2 and bits[1] != 'personal'):
+        raise template.TemplateSyntaxError(
+            f"'{bits[0]}' принимает только необязательный аргумент personal"
+        )
+    nodelist = parser.parse(('endlisting_cache',))
+    parser.delete_first_token()
+    return ListingCacheNode(nodelist, personal=len(bits) == 2)
@@ -0,0 +1,14 @@
+from django import template
+
+from posts.cards import render_cards
+
+register = template.Library()
+
+
+@register.filter
+def post_cards(posts):
+    """Карточки постов страницы из кеша::
+
+        {% for card in page_obj|post_cards %}{{ card }}{% endfor %}
+    """
+    return render_cards(posts)
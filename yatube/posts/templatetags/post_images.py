@@ -0,0 +1,57 @@
+import logging
+from collections import OrderedDict
+
+from django import template
+from django.conf import settings
+from sorl.thumbnail import get_thumbnail
+
+from posts.thumbnails import renditions
+
+logger = logging.getLogger(__name__)
+register = template.Library()
+
+
+def _srcset(thumbnails):
+    widths = OrderedDict()
+    for thumbnail in thumbnails:
+        widths.setdefault(thumbnail.width, thumbnail.url)
+    return ', '.join(f'{url} {width}w' for width, url in widths.items())
+
+
+@register.inclusion_tag('includes/post_picture.html')
+def post_picture(image, css_class='', sizes=None):
+    """Картинка поста в виде <picture> с srcset по всем вариантам.
+
+    Последний формат из ``POST_IMAGE_FORMATS`` идёт в ``<img>`` как
+    запасной, остальные - в ``<source>``. Ошибки, как и у тега
+    ``{% thumbnail %}``, не ломают страницу: картинка просто не выводится.
+    """
+    if not image:
+        return {}
+    by_format = OrderedDict()
+    try:
+        for _, fmt, geometry, options in renditions():
+            thumbnail = get_thumbnail(image, geometry, **options)
+            if thumbnail.size:
+                by_format.setdefault(fmt, []).append(thumbnail)
+    except Exception:
+        logger.exception('Не удалось получить варианты картинки %s', image)
+        return {}
+    if not by_format:
+        return {}
+    *formats, fallback_format = by_format
+    fallback = by_format[fallback_format]
+    largest = fallback[-1]
+    return {
+        'sources': [
+            {'type': f'image/{fmt.lower()}',
+             'srcset': _srcset(by_format[fmt])}
+            for fmt in formats
+        ],
+        'src': largest.url,
+        'srcset': _srcset(fallback),
+        'width': largest.width,
+        'height': largest.height,
+        'sizes': sizes or settings.POST_IMAGE_SIZES,
+        'css_class': css_class,
+    }
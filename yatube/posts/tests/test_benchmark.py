@@ -0,0 +1,58 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from .. import urls as posts_urls
+from ..models import Comment, Follow, Inbox, Post, User
+
+
+class BenchmarkCommandsTest(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+
+    def seed(self, images=0):
+        with self.settings(MEDIA_ROOT=self.tmp_dir):
+            call_command('seed_benchmark', users=6, groups=2, posts=30,
+                         comments=20, follows=3, images=images,
+                         image_ratio=0.5, stdout=StringIO())
+
+    def test_seed_benchmark(self):
+        """Синтетические данные согласованы со счётчиками и лентами."""
+        self.seed(images=1)
+        self.assertEqual(Post.objects.count(), 30)
+        self.assertTrue(Post.objects.exclude(image='').exists())
+        self.assertEqual(Comment.objects.count(), 20)
+        # Даты разбросаны по --days, а не совпадают со временем вставки.
+        self.assertGreater(Post.objects.dates('pub_date', 'day').count(), 1)
+        self.assertTrue(Follow.objects.exists())
+        self.assertTrue(Inbox.objects.exists())
+        top = User.objects.get(username='bench_0')
+        self.assertEqual(top.counters.posts_count, top.posts.count())
+        # Степенной закон: первый автор пишет больше последнего.
+        self.assertGreater(top.posts.count(),
+                           User.objects.get(username='bench_5')
+                           .posts.count())
+
+    def test_run_benchmark_covers_urls(self):
+        """Замер проходит по всем адресам posts.urls и пишет JSON."""
+        self.seed()
+        output = os.path.join(self.tmp_dir, 'bench.json')
+        call_command('run_benchmark', requests=2, warmup=0, output=output,
+                     stderr=StringIO())
+        with open(output) as f:
+            report = json.load(f)
+        names = {key.split(':')[0] for key in report['results']}
+        expected = {pattern.name for pattern in posts_urls.urlpatterns}
+        self.assertEqual(names, expected - {'export'})
+        index = report['results']['index:anon']
+        self.assertEqual(index['status'], 200)
+        self.assertGreater(index['bytes_mean'], 0)
+        self.assertIn('p99_ms', index)
+        self.assertEqual(report['meta']['rows']['posts'], 30)
+        call_command('run_benchmark', requests=1, warmup=0,
+                     baseline=output, stdout=StringIO(), stderr=StringIO())
@@ -0,0 +1,90 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from ..cards import card_key, render_cards
+from ..models import Group, Post, User
+
+
+class PostCardCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой')
+        cls.group = Group.objects.create(title='Классика', slug='classic')
+        cls.post = Post.objects.create(text='Первый пост', author=cls.author,
+                                       group=cls.group)
+        cls.other = Post.objects.create(text='Второй пост', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def listing(self):
+        return list(Post.objects.for_listing().order_by('pk'))
+
+    def stub_cards(self):
+        """Подменяет HTML в кеше, сохраняя версию: видно, что отдаётся."""
+        render_cards(self.listing())
+        for post in (self.post, self.other):
+            version, _ = cache.get(card_key(post.pk))
+            cache.set(card_key(post.pk), (version, f'stub {post.pk}'))
+
+    def test_cards_come_from_one_get_many(self):
+        self.stub_cards()
+        with mock.patch.object(cache, 'get_many',
+                               wraps=cache.get_many) as get_many:
+            cards = render_cards(self.listing())
+        self.assertEqual(get_many.call_count, 1)
+        self.assertEqual(cards, [f'stub {self.post.pk}',
+                                 f'stub {self.other.pk}'])
+
+    def test_card_shared_between_listings(self):
+        """Карточка с главной переиспользуется на странице профиля."""
+        self.client.get(reverse('posts:index'))
+        version, html = cache.get(card_key(self.post.pk))
+        cache.set(card_key(self.post.pk), (version, 'Из кеша карточек'))
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': 'author'}))
+        self.assertContains(response, 'Из кеша карточек')
+
+    def test_update_bypassing_signals_changes_version(self):
+        self.stub_cards()
+        Post.objects.filter(pk=self.post.pk).update(text='Новый текст')
+        first, second = render_cards(self.listing())
+        self.assertIn('Новый текст', first)
+        self.assertEqual(second, f'stub {self.other.pk}')
+
+    def test_signals_forget_cards(self):
+        """Правка и удаление поста, переименование группы и автора."""
+        changes = {
+            'post': lambda: self.post.save(),
+            'group': lambda: self.group.save(),
+            'author': lambda: self.author.save(),
+        }
+        for name, change in changes.items():
+            with self.subTest(change=name):
+                self.stub_cards()
+                change()
+                self.assertIsNone(cache.get(card_key(self.post.pk)))
+        self.stub_cards()
+        self.author.save(update_fields=['last_login'])
+        self.assertIsNotNone(cache.get(card_key(self.post.pk)))
+        Post.objects.get(pk=self.other.pk).delete()
+        self.assertIsNone(cache.get(card_key(self.other.pk)))
+
+    def test_rename_reaches_listings(self):
+        """Новое имя автора видно на страницах, а не только в карточке."""
+        pages = [reverse('posts:index'),
+                 reverse('posts:profile', kwargs={'username': 'author'})]
+        for url in pages:
+            self.assertContains(self.client.get(url), 'Лев Толстой')
+        author = User.objects.get(pk=self.author.pk)
+        author.first_name = 'Алексей'
+        author.save()
+        for url in pages:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, 'Алексей Толстой')
+                self.assertNotContains(response, 'Лев Толстой')
@@ -1,11 +1,15 @@
 import shutil
 import tempfile
 from http import HTTPStatus
+from unittest import mock
 from django.conf import settings
 from django.test import Client, TestCase, override_settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
+from sorl.thumbnail import get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend
 from ..models import Group, Post, User, Comment
+from ..thumbnails import renditions
 
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -80,6 +84,37 @@ class PostFormTests(TestCase):
         self.assertEqual(post.author, self.post_author)
         self.assertEqual(post.group_id, form_data['group'])
 
+    @override_settings(THUMBNAIL_WORKERS=0)
+    @mock.patch('posts.thumbnails.transaction.on_commit',
+                side_effect=lambda func: func())
+    def test_thumbnails_created_on_upload(self, on_commit):
+        """Миниатюры создаются при загрузке, а не при первом показе."""
+        small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+        uploaded = SimpleUploadedFile(
+            name='thumb.gif',
+            content=small_gif,
+            content_type='image/gif'
+        )
+        self.auth_user.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост с картинкой', 'image': uploaded},
+        )
+        post = Post.objects.get(text='Пост с картинкой')
+        on_commit.assert_called_once()
+        with mock.patch.object(ThumbnailBackend,
+                               '_create_thumbnail') as create:
+            for _, _, geometry, options in renditions():
+                thumbnail = get_thumbnail(post.image, geometry, **options)
+                self.assertTrue(thumbnail.exists())
+        create.assert_not_called()
+
     def test_auth_user_edit_post(self):
         """Проверка редактирования записи авторизированным клиентом."""
         post = Post.objects.create(
@@ -0,0 +1,73 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from ..graph import FollowGraph, reset_graph
+from ..models import Follow, User
+
+
+class FollowGraphTest(TestCase):
+    def setUp(self):
+        # 1 -> 2, 3; 2 -> 4, 5; 3 -> 4; 4 -> 1
+        self.graph = FollowGraph.from_pairs(
+            [(1, 2), (1, 3), (2, 4), (2, 5), (3, 4), (4, 1)])
+
+    def test_following_and_followers(self):
+        self.assertEqual(list(self.graph.following(1)), [2, 3])
+        self.assertEqual(list(self.graph.following(5)), [])
+        self.assertEqual(list(self.graph.following(100)), [])
+        self.assertEqual(self.graph.followers_count(4), 2)
+
+    def test_suggestions_rank_by_mutual(self):
+        """Друзья друзей по числу общих подписок, без своих подписок."""
+        self.assertEqual(self.graph.suggestions(1), [(4, 2), (5, 1)])
+
+    def test_incremental_updates(self):
+        """Оверлей меняет подписки без пересборки массивов."""
+        self.graph.remove(1, 3)
+        self.graph.add(1, 5)
+        self.graph.add(1, 5)
+        self.graph.add(7, 4)
+        self.assertEqual(sorted(self.graph.following(1)), [2, 5])
+        self.assertEqual(self.graph.followers_count(5), 2)
+        self.assertEqual(self.graph.followers_count(4), 3)
+        self.assertEqual(self.graph.suggestions(1), [(4, 1)])
+        self.graph.add(1, 3)
+        self.assertEqual(self.graph.suggestions(1), [(4, 2)])
+
+
+class SuggestionsViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.friend = User.objects.create_user(username='friend')
+        cls.author = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+        Follow.objects.create(user=cls.reader, author=cls.friend)
+        Follow.objects.create(user=cls.friend, author=cls.author)
+
+    def setUp(self):
+        reset_graph()
+        self.addCleanup(reset_graph)
+        self.client.force_login(self.reader)
+
+    def suggested(self):
+        response = self.client.get(reverse('posts:suggestions'))
+        return [author.username
+                for author, _ in response.context['suggestions']]
+
+    def test_suggestions_follow_updates(self):
+        """Подписка через вьюху сразу меняет рекомендации."""
+        self.assertEqual(self.suggested(), ['author'])
+        self.client.force_login(self.friend)
+        self.client.get(reverse('posts:profile_follow',
+                                kwargs={'username': self.other.username}))
+        self.client.force_login(self.reader)
+        self.assertEqual(self.suggested(), ['author', 'other'])
+        self.client.get(reverse('posts:profile_follow',
+                                kwargs={'username': self.author.username}))
+        self.assertEqual(self.suggested(), ['other'])
+
+    def test_login_required(self):
+        self.client.logout()
+        response = self.client.get(reverse('posts:suggestions'))
+        self.assertEqual(response.status_code, 302)
@@ -0,0 +1,61 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from ..hot import hot_score, refresh_hot_posts
+from ..models import Comment, Follow, HotPost, Post, User
+
+HOT_POSTS = {
+    'COMMENT_WEIGHT': 1.0,
+    'REACH_WEIGHT': 1.0,
+    'HALF_LIFE_HOURS': 24,
+    'WINDOW_DAYS': 7,
+}
+
+
+@override_settings(HOT_POSTS=HOT_POSTS)
+class HotPostsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        now = timezone.now()
+        cls.posts = {}
+        for name, hours in (('fresh', 1), ('day', 25), ('old', 24 * 10)):
+            post = Post.objects.create(text=name, author=cls.author)
+            Post.objects.filter(pk=post.pk).update(
+                pub_date=now - timedelta(hours=hours))
+            cls.posts[name] = post
+
+    def hot_texts(self):
+        response = self.client.get(reverse('posts:hot'))
+        return [post.text for post in response.context['page_obj']]
+
+    def test_score_decays_with_age(self):
+        """Вдвое больше вовлечённости компенсирует HALF_LIFE часов."""
+        now = timezone.now()
+        fresh = hot_score(0, 0, now)
+        self.assertAlmostEqual(
+            hot_score(1, 0, now - timedelta(hours=24)), fresh)
+        self.assertGreater(fresh, hot_score(0, 0, now - timedelta(hours=1)))
+        self.assertGreater(hot_score(0, 10, now), fresh)
+
+    def test_refresh_is_incremental(self):
+        """Повторный запуск трогает только изменившиеся посты."""
+        self.assertEqual(refresh_hot_posts(), (2, 0, 0))
+        self.assertEqual(refresh_hot_posts(), (0, 0, 0))
+        self.assertEqual(self.hot_texts(), ['fresh', 'day'])
+        for _ in range(3):
+            Comment.objects.create(post=self.posts['day'],
+                                   author=self.reader, text='!')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(refresh_hot_posts(), (0, 2, 0))
+        self.assertEqual(self.hot_texts(), ['day', 'fresh'])
+
+    def test_window_drops_old_posts(self):
+        refresh_hot_posts()
+        later = timezone.now() + timedelta(days=6, hours=12)
+        self.assertEqual(refresh_hot_posts(now=later), (0, 0, 1))
+        self.assertEqual(HotPost.objects.get().post, self.posts['fresh'])
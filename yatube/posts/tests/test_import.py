@@ -0,0 +1,197 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+from ..exporter import export_records, export_stream
+from ..models import Comment, Follow, Group, Inbox, Post, User
+from ..search import get_engine
+
+RECORDS = [
+    {'type': 'group', 'slug': 'cats', 'title': 'Коты',
+     'description': 'Про котов'},
+    {'type': 'user', 'username': 'leo', 'first_name': 'Лев'},
+    {'type': 'post', 'id': 501, 'author': 'leo', 'group': 'cats',
+     'text': 'Кот спит на диване', 'pub_date': '2015-03-01T10:00:00+00:00'},
+    {'type': 'post', 'id': 502, 'author': 'tolstoy',
+     'text': 'Война и мир', 'pub_date': '2016-01-01T00:00:00+00:00'},
+    {'type': 'comment', 'id': 901, 'post': 501, 'author': 'tolstoy',
+     'text': 'Отличный кот', 'pub_date': '2015-03-02T10:00:00+00:00'},
+    {'type': 'follow', 'user': 'tolstoy', 'author': 'leo'},
+]
+
+
+class ImportCommandTest(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+
+    def write_jsonl(self, records, name='archive.jsonl'):
+        path = os.path.join(self.tmp_dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        return path
+
+    def test_import_jsonl(self):
+        """Импорт сохраняет id и даты и обновляет производные данные."""
+        out = StringIO()
+        call_command('import_yatube', self.write_jsonl(RECORDS),
+                     batch_size=2, stdout=out)
+        self.assertIn('записей/с', out.getvalue())
+        post = Post.objects.get(pk=501)
+        self.assertEqual(post.pub_date.year, 2015)
+        self.assertEqual(post.group, Group.objects.get(slug='cats'))
+        self.assertEqual(post.author.first_name, 'Лев')
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(Comment.objects.get(pk=901).pub_date.day, 2)
+        tolstoy = User.objects.get(username='tolstoy')
+        self.assertFalse(tolstoy.has_usable_password())
+        self.assertEqual(tolstoy.counters.following_count, 1)
+        self.assertEqual(post.author.counters.posts_count, 1)
+        self.assertTrue(Inbox.objects.filter(user=tolstoy, post=post)
+                        .exists())
+        self.assertEqual(list(get_engine().search('диване')), [post])
+
+    def test_import_is_idempotent(self):
+        """Повторный импорт того же файла ничего не дублирует."""
+        path = self.write_jsonl(RECORDS)
+        call_command('import_yatube', path, stdout=StringIO())
+        call_command('import_yatube', path, stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertEqual(Follow.objects.count(), 1)
+
+    def test_import_csv(self):
+        """CSV с колонкой type читается так же, как JSONL."""
+        path = os.path.join(self.tmp_dir, 'archive.csv')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('type,id,author,group,text,pub_date\n'
+                    'post,700,leo,,Пост из CSV,2014-05-05T05:05:05\n')
+        call_command('import_yatube', path, stdout=StringIO())
+        post = Post.objects.get(pk=700)
+        self.assertEqual(post.pub_date.year, 2014)
+        self.assertIsNone(post.group)
+
+    def test_resume_from_checkpoint(self):
+        """После ошибки импорт продолжается с контрольной точки."""
+        broken = RECORDS[:4] + [{'type': 'unknown'}] + RECORDS[4:]
+        path = self.write_jsonl(broken)
+        with self.assertRaises(CommandError):
+            call_command('import_yatube', path, batch_size=2,
+                         stdout=StringIO())
+        with open(f'{path}.checkpoint') as f:
+            self.assertEqual(json.load(f), {'line': 4})
+        self.assertEqual(Post.objects.count(), 2)
+        # Исправляем запись: первые четыре строки повторно не читаются.
+        fixed = [{'type': 'post', 'id': 1, 'author': 'leo',
+                  'text': 'Не должен импортироваться'}] * 4 + RECORDS[4:]
+        self.write_jsonl(fixed)
+        out = StringIO()
+        call_command('import_yatube', path, batch_size=2, stdout=out)
+        self.assertIn('Продолжено со строки 4', out.getvalue())
+        self.assertFalse(Post.objects.filter(pk=1).exists())
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertTrue(Follow.objects.exists())
+        self.assertFalse(os.path.exists(f'{path}.checkpoint'))
+
+    def test_conflicting_ids_are_skipped(self):
+        """Чужой пост с тем же id не подменяется и не получает
+        комментарии архива; в счёт идут только вставленные строки."""
+        local = Post.objects.create(
+            pk=501, text='Местный пост',
+            author=User.objects.create_user(username='local'))
+        out = StringIO()
+        call_command('import_yatube', self.write_jsonl(RECORDS),
+                     stdout=out)
+        local.refresh_from_db()
+        self.assertEqual(local.text, 'Местный пост')
+        self.assertFalse(local.comments.exists())
+        self.assertIn('постов 1,', out.getvalue())
+        self.assertIn('пропущено: постов 1', out.getvalue())
+
+    def test_archive_dates_kept(self):
+        call_command('import_yatube', self.write_jsonl(RECORDS),
+                     stdout=StringIO())
+        self.assertEqual(
+            [date.year for date in Post.objects.order_by('pk').values_list(
+                'pub_date', flat=True)],
+            [2015, 2016],
+        )
+
+    def test_bad_ids(self):
+        """Некорректный или пустой id - ошибка команды, а не ValueError."""
+        bad = [
+            {'type': 'comment', 'id': 1, 'post': 'abc', 'author': 'leo',
+             'text': 'x'},
+            {'type': 'post', 'author': 'leo', 'text': 'Без id'},
+        ]
+        for record in bad:
+            with self.subTest(record=record):
+                path = self.write_jsonl([record])
+                with self.assertRaises(CommandError):
+                    call_command('import_yatube', path, restart=True,
+                                 stdout=StringIO())
+
+
+class ExportTest(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        path = os.path.join(self.tmp_dir, 'archive.jsonl')
+        with open(path, 'w', encoding='utf-8') as f:
+            for record in RECORDS:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        call_command('import_yatube', path, stdout=StringIO())
+
+    def test_keyset_batches(self):
+        """Экспорт идёт короткими пачками по первичному ключу."""
+        Post.objects.bulk_create(
+            [Post(text=f'Пост {i}', author=User.objects.get(username='leo'))
+             for i in range(5)]
+        )
+        with self.assertNumQueries(4):
+            posts = list(export_records(types=['post'], batch_size=3))
+        self.assertEqual(len(posts), 7)
+        self.assertEqual(posts[0]['id'], 501)
+
+    def test_round_trip(self):
+        """Выгрузка в CSV и gzip снова загружается через import_yatube."""
+        path = os.path.join(self.tmp_dir, 'export.csv')
+        call_command('export_yatube', output=path, format='csv',
+                     stdout=StringIO())
+        expected = list(Post.objects.values_list('pk', 'text', 'pub_date'))
+        Post.objects.all().delete()
+        Follow.objects.all().delete()
+        call_command('import_yatube', path, stdout=StringIO())
+        self.assertEqual(
+            list(Post.objects.values_list('pk', 'text', 'pub_date')),
+            expected,
+        )
+        self.assertEqual(Comment.objects.get().post_id, 501)
+        self.assertTrue(Follow.objects.exists())
+        data = b''.join(export_stream(compress=True))
+        kinds = [json.loads(line)['type']
+                 for line in gzip.decompress(data).decode().splitlines()]
+        self.assertEqual(kinds.count('post'), 2)
+        self.assertEqual(kinds.count('user'), 2)
+
+    def test_export_endpoint_staff_only(self):
+        """HTTP-выгрузка отдаётся потоком и только сотрудникам."""
+        url = reverse('posts:export')
+        client = Client()
+        client.force_login(User.objects.get(username='leo'))
+        self.assertEqual(client.get(url).status_code, 302)
+        admin = User.objects.create_user(username='admin', is_staff=True)
+        client.force_login(admin)
+        response = client.get(url, {'gzip': '1', 'types': 'post'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        body = gzip.decompress(b''.join(response.streaming_content))
+        records = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([r['id'] for r in records], [501, 502])
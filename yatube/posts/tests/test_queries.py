@@ -0,0 +1,191 @@
+import re
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from ..hot import refresh_hot_posts
+from ..identity import DuplicateFetch, get_cached_object_or_404
+from ..models import Comment, Follow, Group, Post, User
+
+POSTS_TABLE = re.compile(r'\bposts_(post|comment|follow|inbox|hotpost)\b')
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?posts_\w+$')
+
+
+class QueryPlanTest(TestCase):
+    """Запросы списков должны идти по индексам, а не полным сканом."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовое название группы',
+            slug='test_slug',
+            description='Тестовое описание группы',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Post.objects.bulk_create(
+            [Post(text=f'Пост #{i}', author=cls.author, group=cls.group)
+             for i in range(15)]
+        )
+        cls.post = Post.objects.create(text='Пост', author=cls.author,
+                                       group=cls.group)
+        Comment.objects.create(post=cls.post, author=cls.reader,
+                               text='Комментарий')
+        refresh_hot_posts()
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def test_listing_views_use_indexes(self):
+        """EXPLAIN QUERY PLAN списков не содержит полных сканов."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:hot'),
+            reverse('posts:group_list',
+                    kwargs={'group_slug': self.group.slug}),
+            reverse('posts:profile',
+                    kwargs={'username': self.author.username}),
+            reverse('posts:follow_index'),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.get(url)
+                for query in queries.captured_queries:
+                    sql = query['sql']
+                    if not POSTS_TABLE.search(sql):
+                        continue
+                    for step in self.explain(sql):
+                        self.assertNotRegex(step, FULL_SCAN, sql)
+                        self.assertNotIn('TEMP B-TREE', step, sql)
+
+    def test_follow_unique(self):
+        """Повторная подписка не создаёт дубликат."""
+        self.client.get(reverse('posts:profile_follow',
+                                kwargs={'username': self.author.username}))
+        self.assertEqual(Follow.objects.filter(
+            user=self.reader, author=self.author).count(), 1)
+
+
+class ListingQueryBudgetTest(TestCase):
+    """Число запросов списка не зависит от размера страницы."""
+    # Вьюха -> запросов на страницу без учёта сессии и пользователя.
+    BUDGETS = {
+        'posts:index': 1,         # страница по курсору
+        'posts:group_list': 2,    # группа и страница
+        'posts:profile': 3,       # автор, подписка и страница
+        'posts:search': 3,        # COUNT, id из индекса, посты
+        'posts:follow_index': 2,  # COUNT и страница
+    }
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовое название группы',
+            slug='test_slug',
+            description='Тестовое описание группы',
+        )
+        cls.author = User.objects.create_user(username='author')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.client.force_login(self.reader)
+
+    def add_posts(self, count):
+        # Каждый пост от своего автора: ленивые связи дали бы N+1.
+        for i in range(count):
+            author = User.objects.create_user(
+                username=f'author_{Post.objects.count()}')
+            Follow.objects.create(user=self.reader, author=author)
+            Post.objects.create(text=f'Пост про котов {i}', author=author,
+                                group=self.group)
+
+    def urls(self):
+        first = Post.objects.order_by('pk').first()
+        return {
+            'posts:index': reverse('posts:index'),
+            'posts:group_list': reverse(
+                'posts:group_list', kwargs={'group_slug': self.group.slug}),
+            'posts:profile': reverse(
+                'posts:profile', kwargs={'username': first.author.username}),
+            'posts:search': reverse('posts:search') + '?q=котов',
+            'posts:follow_index': reverse('posts:follow_index'),
+        }
+
+    def count_queries(self):
+        counts = {}
+        for name, url in self.urls().items():
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(url)
+            counts[name] = len(queries)
+        return counts
+
+    def test_listing_query_budget(self):
+        """Одна страница и полная страница стоят одинаково."""
+        self.add_posts(1)
+        small = self.count_queries()
+        self.add_posts(12)
+        full = self.count_queries()
+        for name, budget in self.BUDGETS.items():
+            with self.subTest(view=name):
+                self.assertEqual(small[name], full[name])
+                self.assertEqual(full[name], budget + 2)
+
+
+class IdentityMapTest(TestCase):
+    """Объект загружается из БД не больше раза за запрос."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+
+    def test_same_lookup_is_cached(self):
+        """Повторный вызов с теми же условиями не ходит в БД."""
+        request = RequestFactory().get('/')
+        with self.assertNumQueries(1):
+            first = get_cached_object_or_404(request, Post, pk=self.post.pk)
+            second = get_cached_object_or_404(request, Post, pk=self.post.pk)
+        self.assertIs(first, second)
+
+    @override_settings(DEBUG=True)
+    def test_duplicate_fetch_in_debug(self):
+        """При DEBUG повторная загрузка по другому условию - ошибка."""
+        request = RequestFactory().get('/')
+        get_cached_object_or_404(request, Post, pk=self.post.pk)
+        with self.assertRaises(DuplicateFetch):
+            get_cached_object_or_404(request, Post, text='Пост')
+
+    def test_duplicate_fetch_reuses_instance(self):
+        """Без DEBUG повторная загрузка отдаёт первый экземпляр."""
+        request = RequestFactory().get('/')
+        first = get_cached_object_or_404(request, Post, pk=self.post.pk)
+        second = get_cached_object_or_404(request, Post, text='Пост')
+        self.assertIs(first, second)
+
+    def test_post_detail_loads_post_once(self):
+        """Страница поста читает пост одним запросом вместе с ETag."""
+        cache.clear()
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        post_selects = [
+            q['sql'] for q in queries.captured_queries
+            if q['sql'].startswith('SELECT')
+            and 'FROM "posts_post"' in q['sql']
+        ]
+        self.assertEqual(len(post_selects), 1, post_selects)
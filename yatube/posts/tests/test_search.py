@@ -0,0 +1,137 @@
+from unittest import skipUnless
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from ..cards import card_key
+from ..models import Group, Post, User
+from ..search import (FTS_TABLE, LikeEngine, fts5_available, get_engine,
+                      match_expression)
+
+
+class SearchViewTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Кулинария',
+            slug='cooking',
+            description='Тестовое описание группы',
+        )
+        cls.soup = Post.objects.create(
+            text='Рецепт борща со сметаной', author=cls.author,
+        )
+        cls.pie = Post.objects.create(
+            text='Пирог с яблоками', author=cls.author, group=cls.group,
+        )
+        cls.other = Post.objects.create(
+            text='Прогулка по лесу', author=cls.author,
+        )
+
+    def setUp(self):
+        self.client = Client()
+
+    def search(self, query, **params):
+        response = self.client.get(reverse('posts:search'),
+                                   {'q': query, **params})
+        return list(response.context['page_obj'])
+
+    def test_search_by_text_and_group_title(self):
+        """Поиск находит посты по тексту и по названию группы."""
+        self.assertEqual(self.search('борщ'), [self.soup])
+        self.assertEqual(self.search('кулинария'), [self.pie])
+        self.assertEqual(self.search(''), [])
+
+    def test_query_syntax_is_escaped(self):
+        """Операторы и кавычки во вводе не ломают запрос."""
+        self.assertEqual(match_expression('борщ "OR'), '"борщ" "OR"*')
+        self.assertEqual(self.search('борщ" OR *'), [])
+        self.assertEqual(self.search('"(*'), [])
+
+    def test_index_follows_changes(self):
+        """Правка и удаление поста и группы сразу видны в поиске."""
+        other = Post.objects.get(pk=self.other.pk)
+        other.text = 'Прогулка с борщом'
+        other.save()
+        self.assertIn(other, self.search('борщом'))
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Выпечка'
+        group.save()
+        self.assertEqual(self.search('выпечка'), [self.pie])
+        self.assertEqual(self.search('кулинария'), [])
+        Post.objects.get(pk=self.soup.pk).delete()
+        self.assertEqual(self.search('сметаной'), [])
+
+    def test_results_use_card_cache(self):
+        """Результаты выводятся теми же карточками, что и списки."""
+        cache.clear()
+        self.client.get(reverse('posts:index'))
+        version, _ = cache.get(card_key(self.soup.pk))
+        cache.set(card_key(self.soup.pk), (version, 'Из кеша карточек'))
+        response = self.client.get(reverse('posts:search'), {'q': 'борщ'})
+        self.assertContains(response, 'Из кеша карточек')
+
+    def test_pagination_keeps_query(self):
+        """Ссылки пагинации сохраняют поисковый запрос."""
+        Post.objects.bulk_create(
+            [Post(text=f'Суп номер {i}', author=self.author)
+             for i in range(12)]
+        )
+        get_engine().rebuild()
+        response = self.client.get(reverse('posts:search'), {'q': 'суп'})
+        self.assertEqual(response.context['paginator'].count, 12)
+        self.assertContains(response, '?q=%D1%81%D1%83%D0%BF&amp;page=2')
+        self.assertEqual(len(self.search('суп', page=2)), 2)
+
+    @override_settings(POST_SEARCH_ENGINE='like')
+    def test_like_fallback(self):
+        """Запасной движок ищет по тем же полям."""
+        self.assertEqual(self.search('Пирог'), [self.pie])
+        self.assertEqual(self.search('Кулинария'), [self.pie])
+
+    @skipUnless(fts5_available(), 'SQLite собран без FTS5')
+    def test_results_ranked(self):
+        """Пост, где слово встречается чаще, идёт первым."""
+        best = Post.objects.create(text='борщ, борщ и ещё раз борщ',
+                                   author=self.author)
+        self.assertEqual(self.search('борщ'), [best, self.soup])
+
+    @skipUnless(fts5_available(), 'SQLite собран без FTS5')
+    def test_count_matches_queryset(self):
+        """Счётчик видит те же посты, что и срезы: фильтр queryset
+        и осиротевшие строки индекса не сбивают число страниц."""
+        with connection.cursor() as cursor:
+            cursor.execute(f'INSERT INTO {FTS_TABLE} (rowid, text) '
+                           f"VALUES (999999, 'борщ')")
+        results = get_engine().search('борщ')
+        self.assertEqual(results.count(), 1)
+        self.assertEqual(list(results[0:10]), [self.soup])
+        filtered = get_engine().search(
+            'борщ', Post.objects.exclude(pk=self.soup.pk))
+        self.assertEqual(filtered.count(), 0)
+        self.assertEqual(list(filtered[0:10]), [])
+
+    @skipUnless(fts5_available(), 'SQLite собран без FTS5')
+    def test_missing_index_falls_back_to_like(self):
+        """Без таблицы индекса работает LIKE, rebuild создаёт таблицу."""
+        get_engine(require_index=False).drop_index()
+        self.assertIsInstance(get_engine(), LikeEngine)
+        Post.objects.create(text='Наваристые щи', author=self.author)
+        self.assertEqual(len(self.search('щи')), 1)
+        get_engine(require_index=False).rebuild()
+        self.assertEqual(get_engine().name, 'fts5')
+        self.assertEqual(len(self.search('щи')), 1)
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идёт через тот же движок."""
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass',
+        )
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'яблоками'}
+        )
+        self.assertEqual(list(response.context['cl'].result_list),
+                         [self.pie])
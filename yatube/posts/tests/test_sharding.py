@@ -0,0 +1,217 @@
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.db import NotSupportedError, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from ..counters import create_user_counters, recount_comments, recount_users
+from ..exporter import export_stream
+from ..hot import refresh_hot_posts
+from ..models import Comment, Follow, Group, Post, User, UserCounters
+from ..search import fts5_available, get_engine
+from ..sharding import (ShardedListing, ShardRouter, make_pk, shard_for_author,
+                        shard_for_pk)
+
+SHARDS = ['shard1', 'shard2', 'shard3']
+
+
+@override_settings(DATABASE_SHARDS=SHARDS)
+class ShardRoutingTest(TestCase):
+    def test_pk_keeps_shard(self):
+        """Номер шарда восстанавливается из первичного ключа."""
+        for ticket in (1, 2, 1000):
+            for alias in SHARDS:
+                self.assertEqual(shard_for_pk(make_pk(ticket, alias)), alias)
+
+    def test_router_uses_instance(self):
+        """Пост - на шард автора, комментарий - на шард поста."""
+        router = ShardRouter()
+        author = User(pk=4)
+        post = Post(author=author)
+        self.assertEqual(router.db_for_write(Post, instance=post),
+                         shard_for_author(4))
+        self.assertEqual(router.db_for_read(Post, instance=author),
+                         shard_for_author(4))
+        post.pk = make_pk(7, 'shard3')
+        comment = Comment(post=post, author=User(pk=5))
+        self.assertEqual(router.db_for_write(Comment, instance=comment),
+                         'shard3')
+        self.assertIsNone(router.db_for_read(Group))
+        self.assertIsNone(router.db_for_read(Post))
+        self.assertIs(router.allow_migrate('shard1', 'auth'), False)
+        self.assertIs(router.allow_migrate('shard1', 'posts'), True)
+
+    @override_settings(DATABASE_SHARDS=[])
+    def test_disabled(self):
+        router = ShardRouter()
+        self.assertIsNone(router.db_for_write(Post, instance=Post(
+            author=User(pk=1))))
+
+
+class ShardedListingTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username='author')
+        now = timezone.now()
+        for i in range(5):
+            post = Post.objects.create(text=f'Пост {i}', author=author)
+            Post.objects.filter(pk=post.pk).update(
+                pub_date=now - timedelta(hours=i))
+
+    def test_merge_keeps_order(self):
+        """Слияние двух «шардов» идёт по убыванию даты без пропусков."""
+        listing = ShardedListing(Post.objects.all(),
+                                 aliases=['default', 'default'])
+        self.assertEqual(listing.count(), 10)
+        page = listing[2:6]
+        self.assertEqual([post.text for post in page],
+                         ['Пост 1', 'Пост 1', 'Пост 2', 'Пост 2'])
+        older = listing.filter(text__in=['Пост 3', 'Пост 4'])
+        self.assertEqual(older[0].text, 'Пост 3')
+
+
+@override_settings(DATABASE_SHARDS=['shard1', 'shard2'])
+class ShardedWritesTest(TestCase):
+    databases = {'default', 'shard1', 'shard2'}
+
+    @classmethod
+    def setUpClass(cls):
+        # Миграции тестовых шардов снова включают внешние ключи.
+        for alias in ('shard1', 'shard2'):
+            connections[alias].disable_constraint_checking()
+        super().setUpClass()
+
+    def _should_check_constraints(self, connection):
+        # Связи с пользователями и группами из default шард не проверит.
+        return (connection.alias == 'default'
+                and super()._should_check_constraints(connection))
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        cls.first = User.objects.create_user(username='first')
+        cls.second = User.objects.create_user(username='second')
+        cls.reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=cls.reader, author=cls.first)
+        Follow.objects.create(user=cls.reader, author=cls.second)
+
+    def setUp(self):
+        self.client.force_login(self.first)
+
+    def assertListed(self, url, *posts):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        texts = {post.text for post in response.context['page_obj']}
+        self.assertTrue({post.text for post in posts} <= texts, texts)
+
+    def test_orm_writes_land_on_shard(self):
+        """create() и get_or_create() пишут на шард, а не в default."""
+        first = Post.objects.create(text='Первый', author=self.first,
+                                    group=self.group)
+        second, created = Post.objects.get_or_create(
+            text='Второй', author=self.second, defaults={'group': self.group})
+        self.assertTrue(created)
+        comment = Comment.objects.create(post=second, author=self.first,
+                                         text='Комментарий')
+        self.assertEqual(first._state.db, shard_for_author(self.first.pk))
+        self.assertEqual(second._state.db, shard_for_author(self.second.pk))
+        self.assertNotEqual(first._state.db, second._state.db)
+        self.assertEqual(comment._state.db, second._state.db)
+        self.assertFalse(Post.objects.using('default').exists())
+        self.assertEqual(Post.objects.get_or_create(
+            text='Второй', author=self.second)[0], second)
+        self.assertEqual(list(second.comments.all()), [comment])
+        self.assertEqual(Post.objects.using(second._state.db).get(
+            pk=second.pk).comments_count, 1)
+        self.assertListed(reverse('posts:index'), first, second)
+        self.assertListed(reverse('posts:group_list', args=['group']),
+                          first, second)
+        self.assertListed(reverse('posts:profile', args=['second']), second)
+        self.client.force_login(self.reader)
+        self.assertListed(reverse('posts:follow_index'), first, second)
+
+    def test_view_writes_land_on_shard(self):
+        """Пост и комментарий из форм читаются обратно со своего шарда."""
+        self.client.post(reverse('posts:post_create'),
+                         {'text': 'Из формы', 'group': self.group.pk})
+        post = Post.objects.using(shard_for_author(self.first.pk)).get(
+            text='Из формы')
+        self.client.post(reverse('posts:add_comment', args=[post.pk]),
+                         {'text': 'Ответ'})
+        self.assertEqual(post.comments.get().text, 'Ответ')
+        for name in ('posts:post_detail', 'posts:comments'):
+            response = self.client.get(reverse(name, args=[post.pk]))
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, 'Ответ')
+        response = self.client.get(
+            reverse('posts:edit_post', args=[post.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertListed(reverse('posts:index'), post)
+        self.assertListed(reverse('posts:profile', args=['first']), post)
+
+    def test_derived_data_covers_shards(self):
+        """Счётчики, «Популярное» и поиск видят посты всех шардов."""
+        soup = Post.objects.create(text='Наваристый борщ', author=self.first,
+                                   group=self.group)
+        pie = Post.objects.create(text='Пирог с вишней', author=self.second)
+        Comment.objects.create(post=pie, author=self.first, text='Вкусно')
+        UserCounters.objects.update(posts_count=0)
+        Post.objects.using(pie._state.db).update(comments_count=0)
+        self.assertEqual(recount_comments(), 1)
+        self.assertEqual(recount_users(), 2)
+        self.assertEqual(
+            UserCounters.objects.get(user=self.second).posts_count, 1)
+        UserCounters.objects.filter(user=self.first).delete()
+        create_user_counters(self.first.pk)
+        self.assertEqual(
+            UserCounters.objects.get(user=self.first).posts_count, 1)
+        self.assertEqual(refresh_hot_posts(), (2, 0, 0))
+        self.assertListed(reverse('posts:hot'), soup, pie)
+        self.assertEqual(get_engine(require_index=False).rebuild(),
+                         2 if fts5_available() else 0)
+        search = reverse('posts:search')
+        for engine in ('auto', 'like'):
+            with self.subTest(engine=engine), \
+                    override_settings(POST_SEARCH_ENGINE=engine):
+                # LIKE в SQLite не сводит регистр кириллицы.
+                for query, post in (('борщ', soup), ('Группа', soup),
+                                    ('вишней', pie)):
+                    response = self.client.get(search, {'q': query})
+                    self.assertEqual(list(response.context['page_obj']),
+                                     [post])
+        with self.assertRaises(NotSupportedError):
+            export_stream()
+
+    def test_bulk_create_needs_shard(self):
+        with self.assertRaises(NotSupportedError):
+            Post.objects.bulk_create([Post(text='Пакет', author=self.first)])
+        with self.assertRaises(ValueError):
+            Post.objects.create(text='Без автора')
+
+
+@override_settings(DATABASE_SHARDS=['shard1', 'shard2'])
+class ShardMigrationTest(TransactionTestCase):
+    databases = {'default', 'shard1', 'shard2'}
+
+    def tearDown(self):
+        # migrate снова включает внешние ключи, а auth_user на шарде нет.
+        for alias in ('shard1', 'shard2'):
+            connections[alias].disable_constraint_checking()
+        super().tearDown()
+
+    def test_shard_migrates_next_to_populated_default(self):
+        """Шард добавляется к работающей базе: данные миграций не
+        трогают default и не ищут на шарде пользователей."""
+        user = User.objects.create_user(username='reader')
+        call_command('migrate', 'posts', 'zero', database='shard1',
+                     verbosity=0)
+        call_command('migrate', database='shard1', verbosity=0)
+        self.assertEqual(list(UserCounters.objects.values_list(
+            'user_id', flat=True)), [user.pk])
+        self.assertFalse(UserCounters.objects.using('shard1').exists())
+        tables = connections['shard1'].introspection.table_names()
+        self.assertIn('posts_post', tables)
+        self.assertNotIn('auth_user', tables)
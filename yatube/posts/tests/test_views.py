@@ -1,13 +1,23 @@
 import shutil
 import tempfile
-from django.test import Client, TestCase, override_settings
+from io import BytesIO, StringIO
+from unittest import mock
+from django.db import connection
+from django.http import Http404
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.conf import settings
 from django.urls import reverse
 from django.core.cache import cache
+from django.core.management import call_command
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django import forms
-from ..models import Post, Group, User, Follow
+from PIL import Image
+from ..cache import bump_listing_version, get_listing_version
+from ..models import Comment, Post, Group, User, Follow, Inbox
+from ..thumbnails import image_formats
 from ..utils import DataMixin
+from ..views import PostsHome
 
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -171,6 +181,26 @@ class PostPagesTests(TestCase):
         form_field = response.context['page_obj']
         self.assertNotIn(Post.objects.get(group=self.post.group), form_field)
 
+    def test_post_picture_renditions(self):
+        """Картинка отдаётся через <picture> и srcset по ширинам."""
+        buffer = BytesIO()
+        Image.new('RGB', (800, 450), 'white').save(buffer, 'JPEG')
+        post = Post.objects.create(
+            text='Пост с большой картинкой',
+            author=self.user,
+            image=SimpleUploadedFile('big.jpg', buffer.getvalue(),
+                                     content_type='image/jpeg'),
+        )
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id}))
+        content = response.content.decode()
+        self.assertIn('<picture>', content)
+        for width in (320, 640, 800):
+            self.assertIn(f' {width}w', content)
+        self.assertNotIn(' 1280w', content)
+        if 'WEBP' in image_formats():
+            self.assertIn('type="image/webp"', content)
+
     def test_cache_index_page(self):
         """Проверка работы кеша"""
         post = Post.objects.create(
@@ -178,15 +208,47 @@ class PostPagesTests(TestCase):
             author=self.user)
         content_add = self.authorized_client.get(
             reverse('posts:index')).content
-        post.delete()
-        content_delete = self.authorized_client.get(
+        # Изменение в обход сигналов не сбрасывает кеш.
+        Post.objects.filter(pk=post.pk).update(text='Изменённый пост')
+        content_cached = self.authorized_client.get(
             reverse('posts:index')).content
-        self.assertEqual(content_add, content_delete)
+        self.assertEqual(content_add, content_cached)
         cache.clear()
         content_cache_clear = self.authorized_client.get(
             reverse('posts:index')).content
         self.assertNotEqual(content_add, content_cache_clear)
 
+    def test_cache_invalidated_on_post_change(self):
+        """Сохранение и удаление поста сразу сбрасывают кеш списков."""
+        post = Post.objects.create(
+            text='Пост под кеш',
+            author=self.user)
+        content_add = self.authorized_client.get(
+            reverse('posts:index')).content
+        self.assertIn('Пост под кеш'.encode(), content_add)
+        post.text = 'Изменённый пост'
+        post.save()
+        content_edit = self.authorized_client.get(
+            reverse('posts:index')).content
+        self.assertIn('Изменённый пост'.encode(), content_edit)
+        post.delete()
+        content_delete = self.authorized_client.get(
+            reverse('posts:index')).content
+        self.assertNotIn('Изменённый пост'.encode(), content_delete)
+
+    def test_listing_version_bump_is_single_write(self):
+        """Сброс версии пишет новое значение, не читая старое: два
+        процесса не потеряют сброс друг друга."""
+        before = get_listing_version()
+        with mock.patch.object(cache, 'get') as get, \
+                mock.patch.object(cache, 'incr') as incr:
+            first = bump_listing_version()
+            second = bump_listing_version()
+        get.assert_not_called()
+        incr.assert_not_called()
+        self.assertEqual(len({before, first, second}), 3)
+        self.assertEqual(get_listing_version(), second)
+
 
 class PaginatorViewsTest(DataMixin, TestCase):
     @classmethod
@@ -226,6 +288,96 @@ class PaginatorViewsTest(DataMixin, TestCase):
                                  (self.COUNT_CREATE_POST
                                   - DataMixin.paginate_by))
 
+    def test_cache_varies_by_page(self):
+        """Каждая страница списка кешируется отдельно."""
+        cache.clear()
+        url = reverse('posts:index')
+        first = self.client.get(url).content.decode()
+        second = self.client.get(url + '?page=2').content.decode()
+        self.assertIn('Пост #12\n', first)
+        self.assertNotIn('Пост #12\n', second)
+        self.assertIn('Пост #0\n', second)
+
+
+class CursorPaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.COUNT_CREATE_POST = 23
+        cls.user = User.objects.create_user(username='auth')
+        Post.objects.bulk_create(
+            [Post(text=f'Пост #{i}', author=cls.user)
+             for i in range(cls.COUNT_CREATE_POST)]
+        )
+        # Половина постов с одинаковой датой: порядок задаёт id.
+        first = Post.objects.order_by('pk').first()
+        Post.objects.filter(pk__lt=first.pk + 10).update(
+            pub_date=first.pub_date)
+        cls.factory = RequestFactory()
+
+    def get_page(self, cursor=None):
+        data = {'cursor': cursor} if cursor else {}
+        request = self.factory.get(reverse('posts:index'), data)
+        request.user = self.user
+        response = PostsHome.as_view(cursor_pagination=True)(request)
+        response.render()
+        return response.context_data['page_obj']
+
+    def test_cursor_pages_cover_listing(self):
+        """Курсоры проходят всю ленту вперёд и назад без пропусков."""
+        expected = list(Post.objects.order_by('-pub_date', '-pk'))
+        pages = [self.get_page()]
+        while pages[-1].has_next():
+            pages.append(self.get_page(pages[-1].next_cursor))
+        self.assertEqual([post for page in pages for post in page],
+                         expected)
+        self.assertEqual(len(pages[0]), DataMixin.paginate_by)
+        self.assertFalse(pages[0].has_previous())
+        backwards = [pages[-1]]
+        while backwards[-1].has_previous():
+            backwards.append(self.get_page(backwards[-1].previous_cursor))
+        self.assertEqual([list(page) for page in reversed(backwards)],
+                         [list(page) for page in pages])
+
+    def test_cursor_page_without_count(self):
+        """Курсорная страница не выполняет COUNT(*)."""
+        with CaptureQueriesContext(connection) as queries:
+            self.get_page(self.get_page().next_cursor)
+        self.assertFalse(any('COUNT(' in query['sql']
+                             for query in queries.captured_queries))
+
+    def test_deep_page_through_view(self):
+        """Списки листаются курсором: на глубокой странице нет ни
+        COUNT(*), ни OFFSET, а ?page= из старых ссылок работает."""
+        cache.clear()
+        urls = [reverse('posts:index'),
+                reverse('posts:profile', kwargs={'username': 'auth'})]
+        expected = [post.text for post in
+                    Post.objects.order_by('-pub_date', '-pk')]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                texts = [post.text for post in response.context['page_obj']]
+                while response.context['page_obj'].has_next():
+                    cursor = response.context['page_obj'].next_cursor
+                    with CaptureQueriesContext(connection) as queries:
+                        response = self.client.get(url, {'cursor': cursor})
+                    texts += [post.text
+                              for post in response.context['page_obj']]
+                self.assertEqual(texts, expected)
+                sql = ' '.join(query['sql']
+                               for query in queries.captured_queries)
+                self.assertNotIn('COUNT(', sql)
+                self.assertNotIn('OFFSET', sql)
+                response = self.client.get(url, {'page': 3})
+                self.assertEqual(response.context['page_obj'].number, 3)
+                self.assertEqual(len(response.context['page_obj']), 3)
+
+    def test_invalid_cursor(self):
+        """Некорректный курсор даёт 404."""
+        with self.assertRaises(Http404):
+            self.get_page('not-a-cursor')
+
 
 class FollowViewsTest(TestCase):
     @classmethod
@@ -290,3 +442,252 @@ class FollowViewsTest(TestCase):
         response = self.author_client.get(
             reverse('posts:follow_index'))
         self.assertNotIn(post, response.context['page_obj'].object_list)
+
+    def test_inbox_filled_on_post_and_follow(self):
+        """Лента подписок пополняется при подписке и новом посте."""
+        Follow.objects.create(
+            user=self.post_follower,
+            author=self.post_autor)
+        self.assertTrue(Inbox.objects.filter(
+            user=self.post_follower, post=self.post).exists())
+        post = Post.objects.create(
+            author=self.post_autor,
+            text="Новый пост")
+        self.assertTrue(Inbox.objects.filter(
+            user=self.post_follower, post=post,
+            pub_date=post.pub_date).exists())
+
+    def test_inbox_cleared_on_unfollow_and_delete(self):
+        """Отписка и удаление поста убирают записи из ленты."""
+        post = Post.objects.create(
+            author=self.post_autor,
+            text="Новый пост")
+        follow = Follow.objects.create(
+            user=self.post_follower,
+            author=self.post_autor)
+        post.delete()
+        self.assertFalse(Inbox.objects.filter(post_id=post.id).exists())
+        follow.delete()
+        self.assertFalse(Inbox.objects.filter(
+            user=self.post_follower).exists())
+
+    def test_follow_feed_sources_match(self):
+        """Лента из Inbox совпадает с лентой через соединение."""
+        Follow.objects.create(
+            user=self.post_follower,
+            author=self.post_autor)
+        Post.objects.create(
+            author=self.post_autor,
+            text="Новый пост")
+        feeds = {}
+        for source in ('inbox', 'join'):
+            with self.settings(FOLLOW_FEED_SOURCE=source):
+                response = self.author_client.get(
+                    reverse('posts:follow_index'))
+            feeds[source] = list(response.context['page_obj'])
+        self.assertEqual(len(feeds['inbox']), 2)
+        self.assertEqual(feeds['inbox'], feeds['join'])
+
+    def test_backfill_inbox_command(self):
+        """Команда backfill_inbox восстанавливает ленты."""
+        Follow.objects.create(
+            user=self.post_follower,
+            author=self.post_autor)
+        Inbox.objects.all().delete()
+        call_command('backfill_inbox', stdout=StringIO())
+        self.assertTrue(Inbox.objects.filter(
+            user=self.post_follower, post=self.post).exists())
+
+
+class ConditionalGetViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовое название группы',
+            slug='test_slug',
+            description='Тестовое описание группы',
+        )
+        cls.post = Post.objects.create(author=cls.author, group=cls.group,
+                                       text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list',
+                    kwargs={'group_slug': self.group.slug}),
+            reverse('posts:profile',
+                    kwargs={'username': self.author.username}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        ]
+
+    def revalidate(self, client, url):
+        etag = client.get(url)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        return etag, response, queries
+
+    def test_unchanged_page_returns_304(self):
+        """Повторный запрос с тем же ETag - 304 без шаблона и списков."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                _, response, queries = self.revalidate(self.client, url)
+                self.assertEqual(response.status_code, 304)
+                self.assertFalse(response.content)
+                self.assertLessEqual(len(queries), 1)
+                self.assertIn('Cookie', response['Vary'])
+
+    def test_etag_changes_with_content(self):
+        """Новый пост и комментарий меняют ETag."""
+        etags = [self.client.get(url)['ETag'] for url in self.urls]
+        Post.objects.create(author=self.author, group=self.group,
+                            text='Ещё пост')
+        for url, etag in zip(self.urls, etags):
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+        detail = self.urls[-1]
+        etag = self.client.get(detail)['ETag']
+        self.reader_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            {'text': 'Комментарий'})
+        response = self.client.get(detail, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_personal_variants_have_own_etag(self):
+        """У гостя и пользователя разные ETag, подписка меняет свой."""
+        profile = self.urls[2]
+        anonymous = self.client.get(profile)['ETag']
+        etag, response, _ = self.revalidate(self.reader_client, profile)
+        self.assertNotEqual(etag, anonymous)
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('private', response['Cache-Control'])
+        response = self.reader_client.get(profile,
+                                          HTTP_IF_NONE_MATCH=anonymous)
+        self.assertEqual(response.status_code, 200)
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.reader_client.get(profile, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_profile_etag_follows_author(self):
+        """Переименование и удаление автора сбрасывают ETag профиля."""
+        author = User.objects.create_user(username='silent')
+        profile = reverse('posts:profile', kwargs={'username': 'silent'})
+        etag = self.client.get(profile)['ETag']
+        User.objects.filter(pk=author.pk).update(first_name='Новое имя')
+        response = self.client.get(profile, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Новое имя')
+        etag = response['ETag']
+        author.delete()
+        response = self.client.get(profile, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(COMMENTS_PAGE_SIZE=3)
+class CommentsPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(text='Пост', author=author)
+        for i in range(5):
+            Comment.objects.create(
+                post=cls.post, text=f'Комментарий {i}',
+                author=User.objects.create_user(username=f'reader{i}'),
+            )
+
+    def texts(self, page):
+        return [comment.text for comment in page]
+
+    def test_detail_renders_first_batch(self):
+        """Страница поста показывает первую порцию и курсор дальше."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        response = self.client.get(url)
+        page = response.context['comments_page']
+        self.assertEqual(self.texts(page),
+                         ['Комментарий 0', 'Комментарий 1', 'Комментарий 2'])
+        self.assertTrue(page.has_next())
+        self.assertContains(response, 'data-comments-more')
+
+    def test_fragment_loads_next_batch(self):
+        """Фрагмент отдаёт следующую порцию с авторами одним запросом."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        cursor = self.client.get(url).context['comments_page'].next_cursor
+        fragment = reverse('posts:comments', kwargs={'post_id': self.post.id})
+        # Пост и порция комментариев вместе с авторами.
+        with self.assertNumQueries(2):
+            response = self.client.get(fragment, {'cursor': cursor})
+        page = response.context['comments_page']
+        self.assertEqual(self.texts(page), ['Комментарий 3', 'Комментарий 4'])
+        self.assertFalse(page.has_next())
+        self.assertNotContains(response, '<html')
+        self.assertNotContains(response, 'data-comments-more')
+
+    def test_fragment_bad_cursor(self):
+        fragment = reverse('posts:comments', kwargs={'post_id': self.post.id})
+        response = self.client.get(fragment, {'cursor': 'мусор'})
+        self.assertEqual(response.status_code, 404)
+
+
+class FeedFragmentTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        Post.objects.bulk_create(
+            [Post(text=f'Пост #{i}', author=cls.author, group=cls.group)
+             for i in range(DataMixin.paginate_by + 5)]
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_fragment_continues_feed(self):
+        """Фрагменты продолжают ленту без пропусков и без base.html."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'group_slug': 'group'}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:follow_index'),
+        ]
+        expected = list(Post.objects.order_by('-pub_date', '-pk'))
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.reader_client.get(url)
+                posts = list(response.context['page_obj'])
+                next_url = str(response.context['next_fragment_url'])
+                self.assertContains(response, 'data-feed-next')
+                response = self.reader_client.get(url + next_url)
+                self.assertTemplateUsed(response, 'posts/feed_fragment.html')
+                self.assertNotContains(response, '<html')
+                self.assertNotContains(response, 'data-feed-next')
+                posts += list(response.context['page_obj'])
+                self.assertEqual(posts, expected)
+
+    def test_public_fragment_is_shared(self):
+        """Фрагмент общей ленты одинаков для всех и кешируется публично."""
+        url = reverse('posts:index') + '?fragment=1'
+        anonymous = self.client.get(url)
+        response = self.reader_client.get(url)
+        self.assertEqual(response['ETag'], anonymous['ETag'])
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('max-age', response['Cache-Control'])
+        self.assertNotIn('Cookie', response.get('Vary', ''))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=anonymous['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_follow_fragment_is_private(self):
+        url = reverse('posts:follow_index') + '?fragment=1'
+        response = self.reader_client.get(url)
+        self.assertNotIn('public', response.get('Cache-Control', ''))
+        self.assertIn('Cookie', response['Vary'])
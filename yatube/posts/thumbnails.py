@@ -0,0 +1,92 @@
+"""Варианты картинок постов и их генерация сразу после загрузки.
+
+Каждая картинка нарезается в несколько ширин из
+``settings.POST_IMAGE_RENDITIONS`` и в каждый формат из
+``settings.POST_IMAGE_FORMATS``, который умеет кодировать Pillow.
+Шаблоны отдают их через ``srcset``, а генерация идёт в фоновом пуле
+потоков после фиксации транзакции, так что при показе списков
+sorl-thumbnail находит готовые файлы.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from PIL import Image
+from sorl.thumbnail import get_thumbnail
+
+from core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+    return _executor
+
+
+def image_formats():
+    """Настроенные форматы, для которых в Pillow есть кодировщик."""
+    Image.init()
+    return [fmt for fmt in settings.POST_IMAGE_FORMATS if fmt in Image.SAVE]
+
+
+def renditions():
+    """Четвёрки (ширина, формат, geometry, options) для всех вариантов."""
+    ratio_w, ratio_h = settings.POST_IMAGE_ASPECT
+    for width in sorted(settings.POST_IMAGE_RENDITIONS.values()):
+        geometry = f'{width}x{width * ratio_h // ratio_w}'
+        for fmt in image_formats():
+            # Без увеличения: маленькой картинке хватит своих пикселей,
+            # а srcset получит её настоящую ширину.
+            yield width, fmt, geometry, {
+                'crop': 'center', 'upscale': False, 'format': fmt,
+            }
+
+
+def generate_thumbnails(name):
+    """Создаёт все варианты картинки для файла из хранилища."""
+    start = time.perf_counter()
+    created = 0
+    for _, _, geometry, options in renditions():
+        get_thumbnail(name, geometry, **options)
+        created += 1
+    registry.inc('yatube_thumbnails_generated_total', created)
+    registry.observe('yatube_thumbnail_generation_seconds',
+                     time.perf_counter() - start)
+
+
+def _generate_in_worker(name):
+    try:
+        generate_thumbnails(name)
+    except Exception:
+        registry.inc('yatube_thumbnail_failures_total')
+        logger.exception('Не удалось создать миниатюры для %s', name)
+    finally:
+        close_old_connections()
+
+
+def queue_thumbnails(image):
+    """Ставит генерацию миниатюр в очередь после фиксации транзакции."""
+    if not image:
+        return
+    name = image.name
+
+    def submit():
+        if settings.THUMBNAIL_WORKERS:
+            get_executor().submit(_generate_in_worker, name)
+        else:
+            generate_thumbnails(name)
+
+    transaction.on_commit(submit)
@@ -5,22 +5,30 @@ from .views import (PostDetail, PostsHome,
                     CreatePostView,
                     PostDeleteView,
                     PostEditView, FollowView,
-                    AddFollowView, UnfollowView)
+                    AddFollowView, UnfollowView,
+                    SearchView, ExportView, SuggestionsView,
+                    HotPostsView, CommentsFragmentView)
 
 app_name = 'posts'
 
 urlpatterns = [
     path('', PostsHome.as_view(), name='index'),
+    path('hot/', HotPostsView.as_view(), name='hot'),
     path('group/<slug:group_slug>/', GroupPosts.as_view(), name='group_list'),
     path('profile/<str:username>/', Profile.as_view(), name='profile'),
+    path('search/', SearchView.as_view(), name='search'),
+    path('export/', ExportView.as_view(), name='export'),
     path('posts/<int:post_id>/', PostDetail.as_view(), name='post_detail'),
     path('create/', CreatePostView.as_view(), name='post_create'),
     path('posts/<post_id>/edit/', PostEditView.as_view(), name='edit_post'),
     path('posts/<int:post_id>/comment/', CommentCreateView.as_view(),
          name='add_comment'),
+    path('posts/<int:post_id>/comments/', CommentsFragmentView.as_view(),
+         name='comments'),
     path('posts/delete/<int:pk>', PostDeleteView.as_view(),
          name='delete_post'),
     path('follow/', FollowView.as_view(), name='follow_index'),
+    path('suggestions/', SuggestionsView.as_view(), name='suggestions'),
     path(
         'profile/<str:username>/follow/',
         AddFollowView.as_view(),
@@ -1,6 +1,138 @@
+import base64
+import json
+
+from django.core.paginator import InvalidPage, Page, Paginator
+from django.db.models import Q
+from django.http import Http404
+
+
+class CursorPage(Page):
+    """Страница курсорной пагинации: без номеров и без COUNT(*)."""
+    is_cursor = True
+
+    def __init__(self, object_list, paginator,
+                 next_cursor=None, previous_cursor=None):
+        super().__init__(object_list, 1, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<Cursor page>'
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class CursorPaginator(Paginator):
+    """Пагинация по ключу (keyset) вместо OFFSET/LIMIT.
+
+    Страница начинается сразу после записи, закодированной в курсоре,
+    поэтому глубокие страницы читаются так же быстро, как первая.
+    ``ordering`` должен однозначно упорядочивать записи, поэтому
+    последним полем идёт первичный ключ.
+    """
+
+    def __init__(self, object_list, per_page,
+                 ordering=('-pub_date', '-pk')):
+        super().__init__(object_list, per_page)
+        self.ordering = tuple(ordering)
+
+    def _fields(self):
+        opts = self.object_list.model._meta
+        for name in self.ordering:
+            attname = name.lstrip('-')
+            field = opts.pk if attname == 'pk' else opts.get_field(attname)
+            yield attname, field, name.startswith('-')
+
+    def encode_cursor(self, obj, backwards=False):
+        values = [
+            field.value_to_string(obj) if attname != 'pk'
+            else str(obj.pk)
+            for attname, field, _ in self._fields()
+        ]
+        data = json.dumps({'v': values, 'b': backwards},
+                          separators=(',', ':'))
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            values = [
+                field.to_python(value)
+                for (_, field, _), value in zip(self._fields(), data['v'])
+            ]
+            backwards = bool(data['b'])
+        except Exception:
+            raise InvalidPage('Некорректный курсор')
+        if len(values) != len(self.ordering):
+            raise InvalidPage('Некорректный курсор')
+        return values, backwards
+
+    def _after(self, values, backwards):
+        """Условие «строго после курсора» для составного ключа."""
+        condition = Q()
+        equal = {}
+        for (attname, _, descending), value in zip(self._fields(), values):
+            lookup = 'lt' if descending != backwards else 'gt'
+            condition |= Q(**equal, **{f'{attname}__{lookup}': value})
+            equal[attname] = value
+        return condition
+
+    def page(self, cursor=None):
+        queryset = self.object_list
+        backwards = False
+        ordering = list(self.ordering)
+        if cursor:
+            values, backwards = self.decode_cursor(cursor)
+            queryset = queryset.filter(self._after(values, backwards))
+        if backwards:
+            ordering = [name[1:] if name.startswith('-') else f'-{name}'
+                        for name in ordering]
+        objects = list(queryset.order_by(*ordering)[:self.per_page + 1])
+        has_more = len(objects) > self.per_page
+        objects = objects[:self.per_page]
+        if backwards:
+            objects.reverse()
+        next_cursor = previous_cursor = None
+        if objects:
+            if has_more or backwards:
+                next_cursor = self.encode_cursor(objects[-1])
+            if (has_more and backwards) or (cursor and not backwards):
+                previous_cursor = self.encode_cursor(objects[0],
+                                                     backwards=True)
+        return CursorPage(objects, self, next_cursor, previous_cursor)
+
+    def get_page(self, cursor=None):
+        try:
+            return self.page(cursor)
+        except InvalidPage:
+            return self.page()
+
+
 class DataMixin:
     paginate_by = 10
+    # Курсорная пагинация включается во вьюхе: cursor_pagination = True.
+    # Старые ссылки ?page=N при этом по-прежнему листаются номерами.
+    cursor_pagination = False
+    cursor_ordering = ('-pub_date', '-pk')
+    cursor_kwarg = 'cursor'
 
     def get_user_context(self, **kwargs):
         context = kwargs
         return context
+
+    def paginate_queryset(self, queryset, page_size):
+        if (not self.cursor_pagination
+                or self.page_kwarg in self.request.GET):
+            return super().paginate_queryset(queryset, page_size)
+        paginator = CursorPaginator(queryset, page_size,
+                                    ordering=self.cursor_ordering)
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        except InvalidPage as e:
+            raise Http404(str(e))
+        return paginator, page, page.object_list, page.has_other_pages()
@@ -1,4 +1,11 @@
-from django.shortcuts import get_object_or_404, redirect
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, StreamingHttpResponse
+from django.core.paginator import InvalidPage
+from django.db.models import F
+from django.shortcuts import get_object_or_404, redirect, render
 from django.views import View
 from .models import Post, Group, User, Follow
 from django.contrib.auth.mixins import LoginRequiredMixin
@@ -6,51 +13,113 @@ from django.views.generic import (ListView, DetailView,
                                   CreateView, DeleteView,
                                   UpdateView, View)
 from django.utils.decorators import method_decorator
+from .conditional import ConditionalGetMixin
+from .exporter import EXPORT_TYPES, export_stream
 from .forms import PostForm, CommentForm
-from .utils import DataMixin
+from .fragments import FeedFragmentMixin
+from .graph import suggest
+from .identity import get_cached_object_or_404
+from .search import get_engine
+from .sharding import ShardedListing, db_for_post, sharding_enabled
+from .thumbnails import queue_thumbnails
+from .utils import CursorPaginator, DataMixin
 from django.contrib.auth.decorators import login_required
 from django.urls import reverse, reverse_lazy
 
 
-class PostsHome(DataMixin, ListView):
+COMMENT_ORDERING = ('pub_date', 'pk')
+
+
+def comments_page(post, cursor=None):
+    """Порция комментариев поста после ``cursor`` вместе с авторами."""
+    paginator = CursorPaginator(post.comments.with_related('author'),
+                                settings.COMMENTS_PAGE_SIZE,
+                                ordering=COMMENT_ORDERING)
+    return paginator.page(cursor)
+
+
+class PostsHome(FeedFragmentMixin, ConditionalGetMixin, DataMixin,
+                ListView):
     model = Post
     template_name = 'posts/index.html'
+    cursor_pagination = True
 
     def get_queryset(self):
-        return Post.objects.all()
+        if sharding_enabled():
+            return ShardedListing(Post.objects.for_listing())
+        return Post.objects.for_listing()
 
 
-class GroupPosts(DataMixin, ListView):
+class HotPostsView(ConditionalGetMixin, DataMixin, ListView):
+    model = Post
+    template_name = 'posts/hot.html'
+
+    def get_queryset(self):
+        # Порядок готов в HotPost: чтение по индексу -score.
+        posts = Post.objects.for_listing().filter(hot__isnull=False)
+        if sharding_enabled():
+            # HotPost на шарде поста: слияние по рейтингу.
+            return ShardedListing(
+                posts.annotate(hot_score=F('hot__score')),
+                ordering=('-hot_score', '-pk'))
+        return posts.order_by('-hot__score')
+
+
+class GroupPosts(FeedFragmentMixin, ConditionalGetMixin, DataMixin,
+                 ListView):
     model = Post
     template_name = 'posts/group_list.html'
+    cursor_pagination = True
+
+    def get_group(self):
+        return get_cached_object_or_404(self.request, Group,
+                                        slug=self.kwargs['group_slug'])
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        c_def = self.get_user_context(group=get_object_or_404(Group,
-                                      slug=self.kwargs['group_slug']))
+        c_def = self.get_user_context(group=self.get_group())
         context.update(c_def)
         return context
 
     def get_queryset(self):
-        group = get_object_or_404(Group, slug=self.kwargs['group_slug'])
-        return group.posts.select_related('group')
+        posts = self.get_group().posts.for_listing()
+        if sharding_enabled():
+            return ShardedListing(posts)
+        return posts
 
 
-class Profile(DataMixin, ListView):
+class Profile(FeedFragmentMixin, ConditionalGetMixin, DataMixin,
+              ListView):
     model = Post
     template_name = 'posts/profile.html'
     context_object_name = 'posts'
+    cursor_pagination = True
+
+    def get_author(self):
+        return get_cached_object_or_404(
+            self.request, User.objects.select_related('counters'),
+            username=self.kwargs['username'],
+        )
 
     def get_queryset(self):
-        user = get_object_or_404(User, username=self.kwargs['username'])
-        return user.posts.select_related('author')
+        return self.get_author().posts.for_listing()
+
+    def get_etag_parts(self):
+        # Шапка профиля показывает имя автора; удалённый профиль - 404.
+        try:
+            author = self.get_author()
+        except Http404:
+            return None
+        return super().get_etag_parts() + [author.pk,
+                                           author.get_full_name()]
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        author = get_object_or_404(User, username=self.kwargs['username'])
+        author = self.get_author()
         c_def = self.get_user_context(author=author,
                                       following=False)
-        if self.request.user.is_authenticated:
+        # Фрагменту кнопка подписки не нужна, а сессию он не читает.
+        if not self.is_fragment() and self.request.user.is_authenticated:
             c_def['following'] = Follow.objects.filter(
                 user=self.request.user, author=author
             )
@@ -58,24 +127,81 @@ class Profile(DataMixin, ListView):
         return context
 
 
-class PostDetail(DataMixin, DetailView):
+class SearchView(DataMixin, ListView):
+    template_name = 'posts/search.html'
+
+    def get_queryset(self):
+        self.query = self.request.GET.get('q', '').strip()
+        return get_engine().search(self.query, Post.objects.for_listing())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        c_def = self.get_user_context(
+            query=self.query,
+            page_query=urlencode({'q': self.query}) + '&',
+        )
+        context.update(c_def)
+        return context
+
+
+class PostDetail(ConditionalGetMixin, DataMixin, DetailView):
     model = Post
     template_name = 'posts/post_detail.html'
     pk_url_kwarg = 'post_id'
     context_object_name = 'post'
 
+    def get_queryset(self):
+        return Post.objects.using(
+            db_for_post(self.kwargs['post_id'])
+        ).with_related('author__counters', 'group')
+
+    def get_object(self, queryset=None):
+        return get_cached_object_or_404(
+            self.request,
+            self.get_queryset() if queryset is None else queryset,
+            pk=self.kwargs['post_id'],
+        )
+
+    def get_etag_parts(self):
+        # Правки поста меняют версию списков, комментарии - счётчик.
+        # Пост берётся из карты запроса, и get() его уже не перечитает.
+        try:
+            post = self.get_object()
+        except Http404:
+            return None
+        return super().get_etag_parts() + [post.comments_count]
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        post = get_object_or_404(Post, id=self.kwargs['post_id'])
+        # Первая порция сразу в странице, остальные - фрагментами.
+        try:
+            page = comments_page(self.object, self.request.GET.get('cursor'))
+        except InvalidPage:
+            page = comments_page(self.object)
         c_def = self.get_user_context(requser=self.request.user,
-                                      comments=post.comments.select_related(
-                                          'post'),
+                                      comments_page=page,
                                       form=CommentForm(
                                           self.request.POST or None))
         context.update(c_def)
         return context
 
 
+class CommentsFragmentView(View):
+    """Следующая порция комментариев HTML-фрагментом."""
+
+    def get(self, request, *args, **kwargs):
+        post = get_object_or_404(
+            Post.objects.using(db_for_post(kwargs['post_id'])).only('id'),
+            pk=kwargs['post_id'],
+        )
+        try:
+            page = comments_page(post, request.GET.get('cursor'))
+        except InvalidPage as e:
+            raise Http404(str(e))
+        return render(request, 'includes/comment_list.html',
+                      {'post': post, 'comments_page': page})
+
+
 class CreatePostView(LoginRequiredMixin, CreateView):
     template_name = 'posts/create_post.html'
     model = Post
@@ -91,7 +217,8 @@ class CreatePostView(LoginRequiredMixin, CreateView):
             files=self.request.FILES,
             instance=author
         )
-        form.save()
+        post = form.save()
+        queue_thumbnails(post.image)
         return super().form_valid(form)
 
 
@@ -100,6 +227,9 @@ class PostDeleteView(LoginRequiredMixin, DeleteView):
     model = Post
     context_object_name = 'post'
 
+    def get_queryset(self):
+        return Post.objects.using(db_for_post(self.kwargs['pk']))
+
     def get_success_url(self):
         return reverse_lazy('posts:profile',
                             kwargs={'username': self.request.user})
@@ -129,6 +259,23 @@ class PostEditView(DataMixin, UpdateView):
         context.update(c_def)
         return context
 
+    def form_valid(self, form):
+        response = super().form_valid(form)
+        if 'image' in form.changed_data:
+            queue_thumbnails(self.object.image)
+        return response
+
+    def get_queryset(self):
+        return Post.objects.using(db_for_post(self.kwargs['post_id']))
+
+    def get_object(self, queryset=None):
+        # dispatch() и UpdateView.get()/post() получают один экземпляр.
+        return get_cached_object_or_404(
+            self.request,
+            self.get_queryset() if queryset is None else queryset,
+            pk=self.kwargs['post_id'],
+        )
+
     @method_decorator(login_required())
     def dispatch(self, request, *args, **kwargs):
         obj = self.get_object()
@@ -142,7 +289,10 @@ class CommentCreateView(LoginRequiredMixin, CreateView):
     form_class = CommentForm
 
     def get_object(self):
-        return get_object_or_404(Post, id=self.kwargs['post_id'])
+        return get_object_or_404(
+            Post.objects.using(db_for_post(self.kwargs['post_id'])),
+            id=self.kwargs['post_id'],
+        )
 
     def get_success_url(self):
         return reverse(
@@ -158,16 +308,42 @@ class CommentCreateView(LoginRequiredMixin, CreateView):
         return super().form_valid(form)
 
 
-class FollowView(LoginRequiredMixin, DataMixin, ListView):
+class FollowView(LoginRequiredMixin, FeedFragmentMixin, DataMixin,
+                 ListView):
     model = Post
     template_name = 'posts/follow.html'
+    personal_feed = True
 
     def get_queryset(self):
-        return Post.objects.filter(
+        if sharding_enabled():
+            # Подписки в default, посты на шардах: сначала id авторов.
+            authors = Follow.objects.filter(
+                user=self.request.user).values_list('author_id', flat=True)
+            return ShardedListing(
+                Post.objects.for_listing().filter(author_id__in=list(authors))
+            )
+        if settings.FOLLOW_FEED_SOURCE == 'inbox':
+            return Post.objects.for_listing().filter(
+                inbox_entries__user=self.request.user
+            ).order_by('-inbox_entries__pub_date')
+        return Post.objects.for_listing().filter(
             author__following__user=self.request.user
         )
 
 
+class SuggestionsView(LoginRequiredMixin, DataMixin, ListView):
+    template_name = 'posts/suggestions.html'
+    context_object_name = 'suggestions'
+    paginate_by = None
+
+    def get_queryset(self):
+        ranked = suggest(self.request.user.pk, settings.SUGGESTIONS_LIMIT)
+        users = User.objects.select_related('counters').in_bulk(
+            [author_id for author_id, _ in ranked])
+        return [(users[author_id], mutual) for author_id, mutual in ranked
+                if author_id in users]
+
+
 class AddFollowView(LoginRequiredMixin, View):
     def get(self, request, *args, **kwargs):
         user = request.user
@@ -187,3 +363,26 @@ class UnfollowView(LoginRequiredMixin, View):
         if follow:
             follow.delete()
         return redirect('posts:profile', username=self.kwargs['username'])
+
+
+@method_decorator(staff_member_required, name='dispatch')
+class ExportView(View):
+    """Потоковая выгрузка данных для import_yatube, только для staff."""
+
+    def get(self, request, *args, **kwargs):
+        fmt = 'csv' if request.GET.get('format') == 'csv' else 'jsonl'
+        compress = request.GET.get('gzip') == '1'
+        types = [kind for kind in request.GET.get('types', '').split(',')
+                 if kind in EXPORT_TYPES] or EXPORT_TYPES
+        filename = f'yatube.{fmt}'
+        content_type = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+        if compress:
+            filename += '.gz'
+            content_type = 'application/gzip'
+        response = StreamingHttpResponse(
+            export_stream(fmt, compress, types), content_type=content_type
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="{filename}"'
+        )
+        return response
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -50,6 +51,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.QueryInstrumentationMiddleware',
+    'core.db_router.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -89,9 +93,58 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Соединение живёт между запросами: без открытия файла и PRAGMA
+        # на каждый запрос.
+        'CONN_MAX_AGE': int(os.getenv('CONN_MAX_AGE', 60)),
     }
 }
 
+# PRAGMA для каждого нового соединения SQLite (core.sqlite): WAL,
+# чтобы запись постов и комментариев не блокировала чтение, ожидание
+# блокировки вместо ошибки и страницы в памяти.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -20000,
+    'temp_store': 'MEMORY',
+}
+
+# Реплики только для чтения: пути к файлам SQLite через запятую в
+# DATABASE_REPLICAS (копии делает manage.py sync_replicas). Чтения
+# пользователя после записи REPLICA_STICKY_SECONDS идут в основную базу.
+DATABASE_REPLICAS = []
+for number, path in enumerate(
+        filter(None, os.getenv('DATABASE_REPLICAS', '').split(',')), 1):
+    DATABASES[f'replica{number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': path,
+        'CONN_MAX_AGE': DATABASES['default']['CONN_MAX_AGE'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 10))
+
+# Шарды постов и комментариев (posts.sharding): пути к файлам SQLite
+# через запятую в DATABASE_SHARDS; пусто - всё в default. Ссылки на
+# пользователей и группы ведут в default, поэтому внешние ключи на
+# шардах не проверяются. Ключ SHARD оставляет на базе только таблицы
+# posts при migrate.
+DATABASE_SHARDS = []
+for number, path in enumerate(
+        filter(None, os.getenv('DATABASE_SHARDS', '').split(',')), 1):
+    DATABASES[f'shard{number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': path,
+        'CONN_MAX_AGE': DATABASES['default']['CONN_MAX_AGE'],
+        'PRAGMAS': {'foreign_keys': 'OFF'},
+        'SHARD': True,
+    }
+    DATABASE_SHARDS.append(f'shard{number}')
+DATABASE_ROUTERS = ['posts.sharding.ShardRouter',
+                    'core.db_router.ReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -145,7 +198,90 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 CACHES = {
     'default': {
+        'BACKEND': 'core.cache.TieredCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'LOCAL_MAX_ENTRIES': 1000,
+            'LOCAL_MAX_BYTES': 16 * 1024 * 1024,
+            'LOCAL_TIMEOUT': 5,
+            # Версии списков всегда читаем из общего кеша, чтобы другие
+            # процессы видели сброс сразу.
+            'LOCAL_SKIP_PREFIXES': ('posts:listing_version',
+                                    'posts:user_version'),
+        },
+    },
+    'shared': {
         'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
         'LOCATION': os.path.join(BASE_DIR, 'yatube_cache'),
-    }
+    },
+}
+
+# Сколько живут фрагменты списков постов. Устаревшие фрагменты
+# отбрасываются сразу: в ключ входит версия, которую меняют сигналы.
+LISTING_CACHE_TIMEOUT = 60 * 60
+
+# Сколько живут отрендеренные карточки постов (posts.cards). Старая
+# карточка не отдаётся: в записи хранится отпечаток её данных.
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Сколько общий кеш (CDN, прокси) может отдавать фрагменты публичных
+# лент (?fragment=1) без проверки ETag.
+FEED_FRAGMENT_MAX_AGE = 30
+
+# Варианты картинок постов для srcset: имя -> ширина. Создаются сразу
+# после загрузки во всех форматах, которые поддерживает Pillow;
+# последний формат списка - запасной для браузеров без <source>.
+POST_IMAGE_RENDITIONS = {
+    'sm': 320,
+    'md': 640,
+    'lg': 1280,
+    'xl': 1920,
+}
+POST_IMAGE_FORMATS = ['WEBP', 'JPEG']
+POST_IMAGE_ASPECT = (16, 9)
+POST_IMAGE_SIZES = '(min-width: 1400px) 1296px, 100vw'
+# Потоки фоновой генерации миниатюр; 0 - создавать прямо в запросе.
+THUMBNAIL_WORKERS = int(os.getenv('THUMBNAIL_WORKERS', 2))
+
+# Замеры SQL и шаблонов по вьюхам (core.middleware): доля запросов с
+# замером, порог медленного запроса и порог повторов для N+1.
+REQUEST_INSTRUMENTATION = {
+    'SAMPLE_RATE': float(os.getenv('INSTRUMENTATION_SAMPLE_RATE', 0.05)),
+    'SLOW_REQUEST_MS': 500,
+    'N_PLUS_ONE_THRESHOLD': 5,
+    'SERVER_TIMING': DEBUG,
+}
+
+# Метрики /metrics: каталог файлов процессов и период их сброса.
+METRICS_DIR = os.getenv(
+    'METRICS_DIR', os.path.join(tempfile.gettempdir(), 'yatube-metrics'))
+METRICS_FLUSH_INTERVAL = 5
+# Токен для сборщика метрик: Authorization: Bearer <токен>. Без него
+# /metrics доступна только сотрудникам.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Движок поиска /search/: 'auto' - FTS5, если SQLite его поддерживает,
+# иначе 'like'.
+POST_SEARCH_ENGINE = 'auto'
+
+# Источник ленты /follow/: 'inbox' - заранее разложенные записи Inbox,
+# 'join' - соединение Post с Follow при каждом запросе.
+FOLLOW_FEED_SOURCE = 'inbox'
+
+# Граф подписок для /suggestions/ (posts.graph) живёт в памяти процесса;
+# чужие подписки и отписки видны после пересборки раз в столько секунд.
+FOLLOW_GRAPH_MAX_AGE = 300
+SUGGESTIONS_LIMIT = 20
+
+# Комментариев на странице поста и в каждой догружаемой порции.
+COMMENTS_PAGE_SIZE = 20
+
+# Лента «Популярное» (posts.hot): вес комментария и охвата автора, за
+# сколько часов свежесть удваивает рейтинг и за сколько дней берутся
+# посты. Таблицу досчитывает manage.py refresh_hot_posts по расписанию.
+HOT_POSTS = {
+    'COMMENT_WEIGHT': 1.0,
+    'REACH_WEIGHT': 1.0,
+    'HALF_LIFE_HOURS': 24,
+    'WINDOW_DAYS': 7,
 }
@@ -0,0 +1,27 @@
+"""Настройки для тестов: основные настройки и отличия от них."""
+import atexit
+import shutil
+import tempfile
+
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES, REQUEST_INSTRUMENTATION
+
+# Без пула: фоновый поток может пережить временный MEDIA_ROOT теста и
+# писать в уже удаляемый каталог.
+THUMBNAIL_WORKERS = 0
+
+# Выборка инструментации только там, где тест включает её сам, и свой
+# каталог метрик на каждый прогон вместо общего /tmp/yatube-metrics.
+REQUEST_INSTRUMENTATION = {**REQUEST_INSTRUMENTATION, 'SAMPLE_RATE': 0.0}
+METRICS_DIR = tempfile.mkdtemp(prefix='yatube-metrics-')
+atexit.register(shutil.rmtree, METRICS_DIR, ignore_errors=True)
+
+# Шарды для сквозных тестов posts.tests.test_sharding; включаются только
+# в них через override_settings(DATABASE_SHARDS=...).
+for alias in ('shard1', 'shard2'):
+    DATABASES.setdefault(alias, {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f'{alias}.sqlite3',
+        'PRAGMAS': {'foreign_keys': 'OFF'},
+        'SHARD': True,
+    })